@@ -0,0 +1,176 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+
+import exp_regression_channel_backtest as exp_regression
+import logregress_channel_backtest_claude as logregress
+import instrumentation
+from metrics import summarize
+
+# Batch mode for the channel backtests: one worker process per symbol, each
+# writing its own results under <output_dir>/<symbol>_*.csv, followed by a
+# portfolio-level summary built from those files one symbol at a time.
+
+# Output file suffixes and equity column (open positions priced at the
+# close) of each strategy's results CSV
+STRATEGY_OUTPUTS = {
+    'exp': ('backtest_results.csv', 'backtest_stats.csv', 'date', 'equity'),
+    'log': ('backtest_results.csv', 'backtest_metrics.csv', 'Date', 'Equity'),
+}
+# Starting account value of each strategy's per-symbol run
+STRATEGY_START_VALUES = {
+    'exp': 100000,
+    'log': logregress.INITIAL_ACCOUNT_VALUE,
+}
+
+
+def find_symbol_files(data_dir, symbols=None):
+    """Map symbols to their CSVs: every <symbol>.csv in data_dir, or just the listed symbols."""
+    if symbols is None:
+        names = sorted(f for f in os.listdir(data_dir) if f.lower().endswith('.csv'))
+        return {os.path.splitext(name)[0]: os.path.join(data_dir, name) for name in names}
+    return {symbol: os.path.join(data_dir, f"{symbol}.csv") for symbol in symbols}
+
+
+def output_paths(output_dir, symbol, strategy):
+    results_suffix, metrics_suffix, _, _ = STRATEGY_OUTPUTS[strategy]
+    return (os.path.join(output_dir, f"{symbol}_{results_suffix}"),
+            os.path.join(output_dir, f"{symbol}_{metrics_suffix}"))
+
+
+def run_symbol(symbol, file_path, output_dir, strategy='log', window=None):
+    """Backtest one symbol, writing its outputs under unique names. Runs in a worker."""
+    results_csv, metrics_csv = output_paths(output_dir, symbol, strategy)
+    try:
+        if strategy == 'exp':
+            output_data, _ = exp_regression.run_backtest(file_path, window=window, results_csv=results_csv,
+                                                         stats_csv=metrics_csv)
+            final_value = output_data['account_value'].iloc[-1]
+        else:
+            final_value = logregress.backtest(file_path, window=window, results_csv=results_csv,
+                                              metrics_csv=metrics_csv)
+    except Exception as e:
+        status = {'symbol': symbol, 'final_value': np.nan, 'error': f"{type(e).__name__}: {e}"}
+    else:
+        status = {'symbol': symbol, 'final_value': final_value, 'error': ''}
+    if instrumentation.enabled():
+        status[instrumentation.STAGES_KEY] = instrumentation.collect()
+    return status
+
+
+def run_batch(symbol_files, output_dir, strategy='log', window=None, workers=None, max_pending=None,
+              tasks_per_worker=100):
+    """Backtest every symbol in parallel and return one status row per symbol.
+
+    At most max_pending symbols (default twice the worker count) are queued
+    at a time and workers are recycled every tasks_per_worker symbols, so
+    memory stays bounded for universes of thousands of tickers.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or 2 * workers
+    jobs = iter(symbol_files.items())
+    statuses = []
+
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=tasks_per_worker) as executor:
+        pending = set()
+        while True:
+            for symbol, file_path in jobs:
+                pending.add(executor.submit(run_symbol, symbol, file_path, output_dir, strategy, window))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                status = future.result()
+                if instrumentation.STAGES_KEY in status:
+                    instrumentation.merge(status.pop(instrumentation.STAGES_KEY))
+                statuses.append(status)
+                outcome = status['error'] or f"final value {status['final_value']:.2f}"
+                print(f"[{len(statuses)}/{len(symbol_files)}] {status['symbol']}: {outcome}")
+    return statuses
+
+
+def summarize_portfolio(statuses, output_dir, strategy='log', periods_per_year=252):
+    """Build per-symbol and portfolio summaries from the per-symbol output files.
+
+    The portfolio is every symbol's account run side by side; its value is
+    the sum of the symbol accounts' equity. Before a symbol's data starts
+    its account is still uninvested starting cash, and after it ends its
+    last value is carried forward.
+    """
+    _, _, date_column, value_column = STRATEGY_OUTPUTS[strategy]
+    start_value = STRATEGY_START_VALUES[strategy]
+    rows = []
+    portfolio = None
+    accounts = 0
+    for status in sorted(statuses, key=lambda s: s['symbol']):
+        row = dict(status)
+        if not status['error']:
+            results_csv, metrics_csv = output_paths(output_dir, status['symbol'], strategy)
+            metrics = pd.read_csv(metrics_csv)
+            row.update(zip(metrics['Metric'], metrics['Value']))
+            values = pd.read_csv(results_csv, usecols=[date_column, value_column]).set_index(date_column)[value_column]
+            if portfolio is None:
+                portfolio = values
+            else:
+                dates = portfolio.index.union(values.index)
+                portfolio = (portfolio.reindex(dates).ffill().fillna(accounts * start_value)
+                             + values.reindex(dates).ffill().fillna(start_value))
+            accounts += 1
+        rows.append(row)
+
+    symbols = pd.DataFrame(rows)
+    if portfolio is None:
+        return symbols, pd.Series(dtype=float), {}
+    portfolio.name = 'equity'
+    metrics = summarize(portfolio.to_numpy(), int((symbols['error'] == '').sum()), periods_per_year=periods_per_year)
+    metrics['symbols'] = metrics.pop('trades')
+    return symbols, portfolio, metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest a universe of symbols in parallel")
+    parser.add_argument('data_dir', help="directory of <symbol>.csv files")
+    parser.add_argument('--symbols', help="comma-separated symbols, or @file with one per line; default all CSVs")
+    parser.add_argument('--strategy', choices=sorted(STRATEGY_OUTPUTS), default='log')
+    parser.add_argument('--window', type=int, help="rolling regression window in bars; default expanding")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output-dir', default='batch_results')
+    parser.add_argument('--profile', action='store_true', help="print a per-stage timing breakdown at exit")
+    parser.add_argument('--profile-trace', help="also write the stage timings as Chrome trace JSON")
+    args = parser.parse_args(argv)
+
+    if args.profile or args.profile_trace:
+        instrumentation.configure(trace_path=args.profile_trace)
+
+    symbols = None
+    if args.symbols and args.symbols.startswith('@'):
+        with open(args.symbols[1:]) as f:
+            symbols = [line.strip() for line in f if line.strip()]
+    elif args.symbols:
+        symbols = [s.strip() for s in args.symbols.split(',') if s.strip()]
+
+    symbol_files = find_symbol_files(args.data_dir, symbols)
+    if not symbol_files:
+        print(f"No symbol files found in {args.data_dir}")
+        return
+    statuses = run_batch(symbol_files, args.output_dir, strategy=args.strategy, window=args.window,
+                         workers=args.workers)
+
+    symbols_table, portfolio, metrics = summarize_portfolio(statuses, args.output_dir, strategy=args.strategy)
+    symbols_table.to_csv(os.path.join(args.output_dir, 'symbol_summary.csv'), index=False)
+    portfolio.to_csv(os.path.join(args.output_dir, 'portfolio_results.csv'))
+    pd.DataFrame({'Metric': list(metrics), 'Value': list(metrics.values())}).to_csv(
+        os.path.join(args.output_dir, 'portfolio_metrics.csv'), index=False)
+    print(f"Summaries written to {args.output_dir}")
+    for name, value in metrics.items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
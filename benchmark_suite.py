@@ -0,0 +1,224 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Reproducible timings for the hot paths: both channel backtests, the
+# support/resistance scan and the options recorder's write path, on
+# synthetic data of a few fixed sizes. Every case runs in a fresh process so
+# its peak RSS is its own. Results go to a JSON file that a later run can be
+# compared against with --compare.
+
+# Bars per OHLCV series, backtest regression window, and symbols x pulls
+# for the recorder, per size. The backtests' default expanding fit
+# (window=None) costs O(bars^2), so the larger sizes use a rolling window of
+# one session of minute bars.
+SIZES = {
+    'small': {'bars': 1_000, 'window': None, 'symbols': 2, 'pulls': 10},
+    'medium': {'bars': 100_000, 'window': 390, 'symbols': 10, 'pulls': 78},
+    'large': {'bars': 10_000_000, 'window': 390, 'symbols': 50, 'pulls': 390},
+}
+CASES = ['exp_backtest', 'log_backtest', 'support_resistance', 'recorder_write']
+REPEATS = 3
+REGRESSION_THRESHOLD = 1.2  # flag cases this many times slower than the baseline
+NOISE_FLOOR_SECONDS = 0.05  # cases faster than this in both reports are never flagged
+SEED = 0
+
+
+# Function to generate a geometric Brownian motion OHLCV series
+def synthetic_ohlcv(bars, seed=SEED, start='2000-01-03', freq='min', drift=0.05, volatility=0.2,
+                    periods_per_year=252 * 390):
+    rng = np.random.default_rng(seed)
+    dt = 1 / periods_per_year
+    log_returns = (drift - volatility ** 2 / 2) * dt + volatility * np.sqrt(dt) * rng.standard_normal(bars)
+    close = 100 * np.exp(np.cumsum(log_returns))
+    open_ = np.concatenate(([100.0], close[:-1]))
+    wick = volatility * np.sqrt(dt) * np.abs(rng.standard_normal((2, bars)))
+    return pd.DataFrame({
+        'date': pd.date_range(start, periods=bars, freq=freq),
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + wick[0]),
+        'low': np.minimum(open_, close) * (1 - wick[1]),
+        'close': close,
+        'volume': rng.integers(100, 10_000, bars),
+    })
+
+
+def write_ohlcv_csv(path, bars, date_column='date', chunk_rows=1_000_000):
+    """Write a synthetic series to CSV in chunks, so 10M bars never sit in memory twice."""
+    data = synthetic_ohlcv(bars)
+    with open(path, 'w', newline='') as f:
+        for start in range(0, bars, chunk_rows):
+            chunk = data.iloc[start:start + chunk_rows].rename(columns={'date': date_column})
+            chunk.to_csv(f, index=False, header=start == 0)
+
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+def _run_case(case, size, workdir, repeats):
+    # Runs in a fresh worker process. The first call is a warmup that also
+    # fills the market data cache; the timed calls all read from the cache.
+    os.environ['MARKET_DATA_CACHE_DIR'] = os.path.join(workdir, 'cache')
+    config = SIZES[size]
+    bars_csv = os.path.join(workdir, f"{size}_bars.csv")
+    intraday_csv = os.path.join(workdir, f"{size}_intraday.csv")
+    output = os.path.join(workdir, case)
+    os.makedirs(output, exist_ok=True)
+
+    if case == 'exp_backtest':
+        from exp_regression_channel_backtest import run_backtest
+        run = lambda: run_backtest(bars_csv, window=config['window'],
+                                   results_csv=os.path.join(output, 'results.csv'),
+                                   stats_csv=os.path.join(output, 'stats.csv'))
+        items, unit = config['bars'], 'bars'
+    elif case == 'log_backtest':
+        from logregress_channel_backtest_claude import backtest
+        run = lambda: backtest(bars_csv, window=config['window'],
+                               results_csv=os.path.join(output, 'results.csv'),
+                               metrics_csv=os.path.join(output, 'metrics.csv'))
+        items, unit = config['bars'], 'bars'
+    elif case == 'support_resistance':
+        from support_resistance_lines import load_data, find_support_resistance, rank_levels
+
+        def run():
+            data = load_data(intraday_csv)
+            high_peaks, low_peaks = find_support_resistance(data)
+            rank_levels(data, low_peaks, 'support')
+            rank_levels(data, high_peaks, 'resistance')
+        items, unit = config['bars'], 'bars'
+    elif case == 'recorder_write':
+        from options_pipeline import SnapshotWriter
+        from options_storage import create_storage
+        from storage_benchmark import synthetic_pulls
+        snapshots = synthetic_pulls(config['symbols'], config['pulls'])
+
+        def run():
+            directory = tempfile.mkdtemp(dir=output)
+            writer = SnapshotWriter(create_storage('parquet', directory), flush_interval=0.5)
+            for symbol, chain, timestamp in snapshots:
+                writer.put(symbol, chain, timestamp)
+            writer.close()
+            shutil.rmtree(directory, ignore_errors=True)
+        items, unit = len(snapshots), 'snapshots'
+    else:
+        raise ValueError(f"Unknown benchmark case {case!r}, expected one of {CASES}")
+
+    run()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {
+        'seconds': best,
+        'median_seconds': statistics.median(timings),
+        'peak_rss_bytes': _peak_rss_bytes(),
+        'items': items,
+        'throughput': items / best if best > 0 else float('nan'),
+        'unit': unit,
+    }
+
+
+def run_benchmarks(sizes=('small', 'medium'), cases=CASES, repeats=REPEATS, workdir=None):
+    """Time every case at every size and return the report as a dict."""
+    workdir = workdir or tempfile.mkdtemp(prefix='benchmark_suite_')
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'repeats': repeats,
+        'results': {},
+    }
+    context = multiprocessing.get_context('spawn')
+    try:
+        for size in sizes:
+            bars = SIZES[size]['bars']
+            write_ohlcv_csv(os.path.join(workdir, f"{size}_bars.csv"), bars)
+            write_ohlcv_csv(os.path.join(workdir, f"{size}_intraday.csv"), bars, date_column='date_time')
+            for case in cases:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    try:
+                        result = executor.submit(_run_case, case, size, workdir, repeats).result()
+                    except Exception as e:
+                        result = {'error': f"{type(e).__name__}: {e}"}
+                report['results'][f"{case}/{size}"] = result
+                _print_result(f"{case}/{size}", result)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def _print_result(name, result):
+    if 'error' in result:
+        print(f"{name:32s} error: {result['error']}")
+        return
+    rss = f"{result['peak_rss_bytes'] / 1e6:8.1f} MB" if result['peak_rss_bytes'] else '       n/a'
+    print(f"{name:32s} {result['seconds']:9.3f}s  {rss}  {result['throughput']:14,.0f} {result['unit']}/s")
+
+
+def compare_reports(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """Rows of (case, baseline seconds, seconds, ratio, regressed) for cases in both reports."""
+    rows = []
+    for name, result in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or 'seconds' not in previous or 'seconds' not in result:
+            continue
+        ratio = result['seconds'] / previous['seconds'] if previous['seconds'] > 0 else float('nan')
+        noise = max(result['seconds'], previous['seconds']) < NOISE_FLOOR_SECONDS
+        rows.append((name, previous['seconds'], result['seconds'], ratio, ratio > threshold and not noise))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the backtests, S/R scan and options recorder")
+    parser.add_argument('--sizes', default='small,medium', help=f"comma-separated, from {list(SIZES)}")
+    parser.add_argument('--cases', default=','.join(CASES), help="comma-separated benchmark cases")
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON report to write")
+    parser.add_argument('--compare', help="baseline JSON report to compare against")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(',')
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes {unknown}")
+    report = run_benchmarks(sizes, args.cases.split(','), args.repeats)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = 0
+        for name, before, after, ratio, regressed in compare_reports(report, baseline, args.threshold):
+            regressions += regressed
+            print(f"{name:32s} {before:9.3f}s -> {after:9.3f}s  x{ratio:5.2f}{'  REGRESSION' if regressed else ''}")
+        if regressions:
+            raise SystemExit(1)
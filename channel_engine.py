@@ -0,0 +1,272 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from incremental_regression import regression_arrays
+from metrics import in_market
+
+# Array-backed engine for the two channel strategies. Bands are computed for
+# every bar at once, entries and exits become boolean masks, and the position
+# state machine only visits the bars where a trade can happen. Trades are
+# reported by bar index; callers map them back to dates.
+
+WARMUP_BARS = 100
+KELLY_AFTER = 3 * 252  # bars before the log strategy switches to Kelly sizing
+
+def exp_channel_bands(close, window=None, warmup=WARMUP_BARS, chunk_size=1 << 22):
+    """Predicted price and price-residual stdev of the exp_regression_channel_backtest channel.
+
+    Bar i uses the fit over the bars before it (x = 1..i), or over the last
+    `window` of them with a rolling window. Bars before `warmup` are NaN.
+    """
+    close = np.asarray(close, dtype=float)
+    size = len(close)
+    predicted = np.full(size, np.nan)
+    stdev = np.full(size, np.nan)
+    if size <= warmup:
+        return predicted, stdev
+
+    fit = regression_arrays(close, window=window, x_start=1)
+    bars = np.arange(warmup, size)
+    slope = fit.slope[bars - 1]
+    intercept = fit.intercept[bars - 1]
+    predicted[bars] = np.exp(intercept + slope * bars)
+
+    # The stdev is of price-space residuals, which depend on every fitted bar,
+    # so it is evaluated over blocks of bars to keep memory bounded
+    if window is None:
+        rows = max(1, chunk_size // size)
+        for start in range(0, len(bars), rows):
+            block = bars[start:start + rows]
+            width = block[-1]
+            x = np.arange(1, width + 1)
+            inside = x[None, :] <= block[:, None]
+            residuals = close[None, :width] - np.exp(intercept[start:start + rows, None] + slope[start:start + rows, None] * x[None, :])
+            counts = block.astype(float)
+            mean = np.where(inside, residuals, 0.0).sum(axis=1) / counts
+            deviation = np.where(inside, residuals - mean[:, None], 0.0)
+            stdev[block] = np.sqrt(np.einsum('ij,ij->i', deviation, deviation) / counts)
+    else:
+        # Bars still inside the first window see a shorter, expanding fit
+        head = bars[bars < window]
+        for i in head:
+            x = np.arange(1, i + 1)
+            stdev[i] = np.std(close[:i] - np.exp(fit.intercept[i - 1] + fit.slope[i - 1] * x))
+        tail = bars[bars >= window]
+        if len(tail):
+            views = sliding_window_view(close, window)
+            offsets = np.arange(window)
+            rows = max(1, chunk_size // window)
+            for start in range(0, len(tail), rows):
+                block = tail[start:start + rows]
+                x = (block - window + 1)[:, None] + offsets[None, :]
+                fitted = np.exp(fit.intercept[block - 1, None] + fit.slope[block - 1, None] * x)
+                stdev[block] = np.std(views[block - window] - fitted, axis=1)
+    return predicted, stdev
+
+
+def exp_channel_signals(open_, close, predicted, stdev, band_mult=0.5):
+    """Entry and exit masks of the exp channel strategy."""
+    open_ = np.asarray(open_, dtype=float)
+    close = np.asarray(close, dtype=float)
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    prev_predicted = np.concatenate(([np.nan], predicted[:-1]))
+    with np.errstate(invalid='ignore'):
+        buy = (open_ > (predicted - stdev) - band_mult * stdev) & (prev_close < prev_predicted - band_mult * stdev)
+        sell = open_ > predicted + stdev
+    return buy, sell
+
+
+def exp_channel_kernel(open_, close, buy, sell, spread=0.0002, start_value=100000, warmup=WARMUP_BARS):
+    """Run the one-share exp channel position machine.
+
+    Returns the trades as (side, bar, price, equity) tuples, the cash after
+    each bar from `warmup` on, and the account value with the open position
+    priced at each bar's close. A bar can open and close a position.
+    """
+    open_ = np.asarray(open_, dtype=float)
+    buy_bars = np.flatnonzero(buy)
+    sell_bars = np.flatnonzero(sell)
+    equity = start_value
+    trades = []
+
+    bar = warmup
+    while True:
+        k = np.searchsorted(buy_bars, bar)
+        if k == len(buy_bars):
+            break
+        entry = buy_bars[k]
+        buy_price = open_[entry]
+        equity -= buy_price * (1 + spread)
+        trades.append(('BUY', entry, buy_price, equity))
+
+        k = np.searchsorted(sell_bars, entry)
+        if k == len(sell_bars):
+            break
+        exit_ = sell_bars[k]
+        sell_price = open_[exit_]
+        equity += sell_price * (1 - spread)
+        trades.append(('SELL', exit_, sell_price, equity))
+        bar = exit_ + 1
+
+    cash = _equity_curve(trades, len(open_), start_value, warmup)
+    held = [1 if t[0] == 'BUY' else -1 for t in trades]
+    return trades, cash, cash + _holdings(trades, held, len(open_), warmup) * np.asarray(close, dtype=float)[warmup:]
+
+
+def log_channel_bands(close, window=None, warmup=WARMUP_BARS):
+    """Center, upper and lower bands of the logregress_channel_backtest_claude channel.
+
+    Bar i uses the fit over the bars before it (x = 0..i-1), with the bands
+    one slope standard error either side of the log center. Bars before
+    `warmup` are NaN.
+    """
+    close = np.asarray(close, dtype=float)
+    size = len(close)
+    center = np.full(size, np.nan)
+    upper = np.full(size, np.nan)
+    lower = np.full(size, np.nan)
+    if size <= warmup:
+        return center, upper, lower
+
+    fit = regression_arrays(close, window=window)
+    bars = np.arange(warmup, size)
+    log_center = fit.slope[bars - 1] * (bars - 1) + fit.intercept[bars - 1]
+    std_err = fit.std_err[bars - 1]
+    center[bars] = np.exp(log_center)
+    upper[bars] = np.exp(log_center + std_err)
+    lower[bars] = np.exp(log_center - std_err)
+    return center, upper, lower
+
+
+def log_channel_signals(open_, high, close, center, upper, lower, band_mult=0.5):
+    """Entry/exit masks and fill prices of the log channel strategy.
+
+    band_mult places the entry bands between the center (0) and the outer
+    bands (1); the backtest uses the halfway lines.
+    """
+    open_ = np.asarray(open_, dtype=float)
+    high = np.asarray(high, dtype=float)
+    close = np.asarray(close, dtype=float)
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    lower_half = (1 - band_mult) * center + band_mult * lower
+    upper_half = (1 - band_mult) * center + band_mult * upper
+    with np.errstate(invalid='ignore'):
+        buy_at_open = (open_ > lower_half) & (prev_close < upper_half)
+        buy_at_band = (high > lower_half) & (open_ < lower_half)
+        sell = (open_ > upper) | ((high > upper) & (open_ < upper))
+    buy_price = np.where(buy_at_open, open_, lower_half)
+    sell_price = np.minimum(open_, upper)
+    return buy_at_open | buy_at_band, buy_price, sell, sell_price
+
+
+def log_channel_kernel(buy, buy_price, sell, sell_price, close, kelly, start_value=100000,
+                       allocation=1.0, margin=0.5, spread=0.0002, kelly_after=KELLY_AFTER,
+                       warmup=WARMUP_BARS):
+    """Run the Kelly-sized log channel position machine.
+
+    kelly(avg_profit, avg_loss, win_ratio) returns the allocation used once
+    bar `kelly_after` has passed and there is at least one winning and one
+    losing trade. Returns (side, bar, price, shares, account_value) trades;
+    from `warmup` on, the account value (cash) after each bar, the account
+    value with the open position priced at each bar's close, and the
+    allocation in effect on each bar; and the profits and losses of closed
+    trades.
+    """
+    size = len(buy)
+    buy_bars = np.flatnonzero(buy)
+    sell_bars = np.flatnonzero(sell)
+    account_value = start_value
+    start_allocation = allocation
+    trades = []
+    profits = []
+    losses = []
+    kelly_bars = []
+    kelly_values = []
+    kelly_allocation = None
+
+    bar = warmup
+    while True:
+        k = np.searchsorted(buy_bars, bar)
+        if k == len(buy_bars):
+            break
+        entry = buy_bars[k]
+        entry_price = buy_price[entry]
+        # Kelly is refreshed at the end of every bar after kelly_after, so the
+        # entry bar sees the value computed from all earlier exits
+        if kelly_allocation is not None and entry - 1 > kelly_after:
+            allocation = kelly_allocation
+        shares = int((account_value * allocation * (1 + margin)) / entry_price)
+        account_value -= shares * entry_price * (1 + spread)
+        trades.append(('buy', entry, entry_price, shares, account_value))
+        if shares == 0:
+            bar = entry + 1
+            continue
+        if shares < 0:
+            # A negative account value leaves a short position that the
+            # strategy never trades out of
+            break
+
+        k = np.searchsorted(sell_bars, entry + 1)
+        if k == len(sell_bars):
+            break
+        exit_ = sell_bars[k]
+        exit_price = sell_price[exit_]
+        revenue = shares * exit_price * (1 - spread)
+        profit = revenue - (shares * entry_price)
+        account_value += revenue
+        if profit > 0:
+            profits.append(profit)
+        else:
+            losses.append(profit)
+        trades.append(('sell', exit_, exit_price, shares, account_value))
+        bar = exit_ + 1
+
+        if profits and losses:
+            avg_profit = np.mean(profits)
+            avg_loss = abs(np.mean(losses))
+            win_ratio = len(profits) / (len(profits) + len(losses))
+            kelly_allocation = kelly(avg_profit, avg_loss, win_ratio)
+            kelly_bars.append(max(exit_ + 1, kelly_after + 2))
+            kelly_values.append(kelly_allocation)
+
+    values = _equity_curve([(t[0], t[1], t[2], t[4]) for t in trades], size, start_value, warmup)
+    held = [t[3] if t[0] == 'buy' else -t[3] for t in trades]
+    equity = values + _holdings(trades, held, size, warmup) * np.asarray(close, dtype=float)[warmup:]
+    bars = np.arange(warmup, size)
+    latest = np.searchsorted(np.asarray(kelly_bars, dtype=int), bars, side='right') - 1
+    allocations = np.where(latest >= 0, np.asarray(kelly_values + [start_allocation])[latest], start_allocation)
+    return trades, values, equity, allocations, profits, losses
+
+
+def position_mask(trades, size, warmup=WARMUP_BARS):
+    """Bars from `warmup` on that hold a position, from either kernel's trades."""
+    # Log kernel buys carry the share count; a zero-share buy opens nothing
+    entries = [t[1] for t in trades if t[0].lower() == 'buy' and (len(t) < 5 or t[3] > 0)]
+    exits = [t[1] for t in trades if t[0].lower() == 'sell']
+    return in_market(entries, exits, size, warmup)
+
+
+def exp_trade_pnl(trades, spread=0.0002):
+    """Profit or loss of each closed one-share round trip from exp_channel_kernel."""
+    buys = np.array([t[2] for t in trades if t[0] == 'BUY'], dtype=float)
+    sells = np.array([t[2] for t in trades if t[0] == 'SELL'], dtype=float)
+    buys = buys[:len(sells)]
+    return sells * (1 - spread) - buys * (1 + spread)
+
+
+def _equity_curve(trades, size, start_value, warmup):
+    # Equity only changes on trade bars; every other bar carries the last value
+    bars = np.arange(warmup, size)
+    if not trades:
+        return np.full(len(bars), float(start_value))
+    trade_bars = np.array([t[1] for t in trades])
+    trade_values = np.array([t[3] for t in trades], dtype=float)
+    latest = np.searchsorted(trade_bars, bars, side='right') - 1
+    return np.where(latest >= 0, trade_values[latest], float(start_value))
+
+
+def _holdings(trades, shares, size, warmup):
+    # Shares held at the close of each bar from `warmup` on; shares is the
+    # signed change of each trade, and a trade's bar already reflects it
+    change = np.zeros(size - warmup + 1)
+    np.add.at(change, np.array([t[1] for t in trades], dtype=np.int64) - warmup, shares)
+    return np.cumsum(change[:-1])
@@ -1,85 +1,76 @@
 #chatgpt 4o
 import pandas as pd
-import numpy as np
-from scipy.stats import linregress
-import math
+from channel_engine import exp_channel_bands, exp_channel_signals, exp_channel_kernel, exp_trade_pnl, position_mask
+from market_data import load_frame
+import instrumentation
+from metrics import summarize
 
-def exponential_regression(y, x):
-    log_y = np.log(y)
-    slope, intercept, r_value, p_value, std_err = linregress(x, log_y)
-    return np.exp(intercept), slope
+# Rows of the stats CSV: summarize() key -> metric name
+STAT_NAMES = {
+    'sharpe': 'Sharpe',
+    'sortino': 'Sortino',
+    'max_drawdown': 'Max Drawdown',
+    'max_drawdown_duration': 'Max Drawdown Duration',
+    'cagr': 'CAGR',
+    'volatility': 'Volatility',
+    'exposure': 'Exposure',
+    'turnover': 'Turnover',
+    'trades': 'Trades',
+    'win_rate': 'Win Rate',
+    'profit_factor': 'Profit Factor',
+    'expectancy': 'Expectancy',
+}
 
-def calculate_channel(stock_data, start_day):
-    x = np.arange(1, start_day + 1)
-    y = stock_data['close'][:start_day]
-    a, b = exponential_regression(y, x)
-    predicted = a * np.exp(b * x)
-    residuals = stock_data['close'][:start_day] - predicted
-    stdev = np.std(residuals)
-    return predicted, stdev
-
-def run_backtest(input_csv, spread=0.0002, start_value=100000, margin=0.5, percent_of_account=1.0, kelly_fraction=0.5):
-    # Load stock data
-    stock_data = pd.read_csv(input_csv)
+def run_backtest(input_csv, spread=0.0002, start_value=100000, margin=0.5, percent_of_account=1.0, kelly_fraction=0.5, window=None,
+                 results_csv='backtest_results.csv', stats_csv='backtest_stats.csv', periods_per_year=252):
+    # Load stock data in file order, as read_csv did; dates are parsed and
+    # columns other than the date and numbers are not loaded
+    with instrumentation.stage('exp.load'):
+        stock_data = load_frame(input_csv, sort=False)
+        close = stock_data['close'].to_numpy(dtype=float)
+        open_ = stock_data['open'].to_numpy(dtype=float)
     
-    # Add regression lines
-    stock_data['predicted'] = np.nan
-    stock_data['-1_stdev'] = np.nan
-    stock_data['1_stdev'] = np.nan
+    # Add regression lines; window=None fits every bar before the current one
+    with instrumentation.stage('exp.channel'):
+        predicted, stdev = exp_channel_bands(close, window=window)
+    stock_data['predicted'] = predicted
+    stock_data['-1_stdev'] = predicted - stdev
+    stock_data['1_stdev'] = predicted + stdev
     
-    equity = start_value
-    positions = []
-    account_value = []
-    trades = []
+    with instrumentation.stage('exp.signals'):
+        buy, sell = exp_channel_signals(open_, close, predicted, stdev)
+    with instrumentation.stage('exp.execution'):
+        bar_trades, account_value, equity = exp_channel_kernel(open_, close, buy, sell, spread=spread,
+                                                               start_value=start_value)
+    instrumentation.count('exp.trades', len(bar_trades))
+    dates = stock_data['date']
+    trades = [(side, dates.iloc[bar], price, equity) for side, bar, price, equity in bar_trades]
     
-    for i in range(100, len(stock_data)):
-        predicted, stdev = calculate_channel(stock_data, i)
-        
-        stock_data.at[i, 'predicted'] = predicted[-1]
-        stock_data.at[i, '-1_stdev'] = predicted[-1] - stdev
-        stock_data.at[i, '1_stdev'] = predicted[-1] + stdev
-        
-        # Buying condition
-        if len(positions) == 0:
-            if stock_data['open'][i] > (stock_data['-1_stdev'][i] - 0.5 * stdev) and stock_data['close'][i-1] < (stock_data['predicted'][i-1] - 0.5 * stdev):
-                buy_price = stock_data['open'][i]
-                positions.append(buy_price)
-                equity -= buy_price * (1 + spread)
-                trades.append(('BUY', stock_data['date'][i], buy_price, equity))
-        
-        # Selling condition
-        if len(positions) > 0:
-            buy_price = positions[-1]
-            if stock_data['open'][i] > (stock_data['1_stdev'][i]):
-                sell_price = stock_data['open'][i]
-                equity += sell_price * (1 - spread)
-                positions.pop()
-                trades.append(('SELL', stock_data['date'][i], sell_price, equity))
-        
-        account_value.append(equity)
-    
-    # Output account value
+    # Output account value (cash) and equity with the open share at the close
     output_data = pd.DataFrame({
         'date': stock_data['date'][100:],
-        'account_value': account_value
+        'account_value': account_value,
+        'equity': equity
     })
     
-    # Sharpe, Sortino, and drawdown calculation
-    returns = np.diff(account_value) / account_value[:-1]
-    sharpe_ratio = np.mean(returns) / np.std(returns)
-    sortino_ratio = np.mean(returns) / np.std(returns[returns < 0])
-    max_drawdown = np.min(returns)
+    # Sharpe, Sortino, drawdown and trade statistics of the equity curve
+    with instrumentation.stage('exp.metrics'):
+        summary = summarize(equity, len(bar_trades), periods_per_year=periods_per_year,
+                            trade_pnl=exp_trade_pnl(bar_trades, spread),
+                            positions=position_mask(bar_trades, len(close)))
     
     # Write to CSV
-    output_data.to_csv('backtest_results.csv', index=False)
-    
-    stats_data = pd.DataFrame({
-        'Metric': ['Sharpe', 'Sortino', 'Max Drawdown'],
-        'Value': [sharpe_ratio, sortino_ratio, max_drawdown]
-    })
-    stats_data.to_csv('backtest_stats.csv', index=False)
+    with instrumentation.stage('exp.write'):
+        output_data.to_csv(results_csv, index=False)
+        
+        stats_data = pd.DataFrame({
+            'Metric': list(STAT_NAMES.values()),
+            'Value': [summary[key] for key in STAT_NAMES]
+        })
+        stats_data.to_csv(stats_csv, index=False)
     
     return output_data, stats_data
 
 # Example usage
-run_backtest('stock_data.csv')
\ No newline at end of file
+if __name__ == "__main__":
+    run_backtest('stock_data.csv')
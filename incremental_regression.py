@@ -0,0 +1,208 @@
+import math
+from collections import deque, namedtuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Result of a regression fit: ln(y) = intercept + slope * x for the
+# exponential fits, y = intercept + slope * x for the linear ones
+RegressionFit = namedtuple('RegressionFit', ['slope', 'intercept', 'std_err', 'stdev', 'r_squared', 'n'])
+
+
+class IncrementalLinearRegression:
+    """Least-squares line over consecutive bars, updated in O(1) per bar.
+
+    Keeps the running sums of x, y, x*y, x^2 and y^2, so the fit never has to
+    be recomputed from the full history. With window=None the fit expands over
+    every bar seen; otherwise it covers the last `window` bars. Bar x values
+    are consecutive integers starting at x_start.
+    """
+
+    def __init__(self, window=None, x_start=0):
+        if window is not None and window < 3:
+            raise ValueError("window must be at least 3 bars")
+        self.window = window
+        self.n = 0
+        self.first_x = x_start
+        self._y_ref = None
+        self._values = deque()
+        # x is stored relative to first_x and y relative to _y_ref to
+        # keep the sums small and avoid cancellation on long histories
+        self._sum_y = 0.0
+        self._sum_xy = 0.0
+        self._sum_y2 = 0.0
+        self._evictions = 0
+
+    @property
+    def last_x(self):
+        return self.first_x + self.n - 1
+
+    def _transform(self, price):
+        return price
+
+    def update(self, price):
+        """Add the next bar's price to the fit."""
+        y = self._transform(price)
+        if self._y_ref is None:
+            self._y_ref = y
+        y -= self._y_ref
+
+        self._sum_y += y
+        self._sum_xy += self.n * y
+        self._sum_y2 += y * y
+        self.n += 1
+
+        if self.window is not None:
+            self._values.append(y)
+            if self.n > self.window:
+                self._evict()
+
+    def _evict(self):
+        # The oldest bar sits at relative x = 0, so it adds nothing to sum_xy.
+        # Removing it shifts every remaining bar's relative x down by one.
+        old = self._values.popleft()
+        self.n -= 1
+        self.first_x += 1
+        self._sum_y -= old
+        self._sum_y2 -= old * old
+        self._sum_xy -= self._sum_y
+
+        # Rebuild the sums once per window length so rounding error from the
+        # add/subtract updates cannot drift; amortized cost stays O(1)
+        self._evictions += 1
+        if self._evictions >= self.window:
+            self._evictions = 0
+            self._sum_y = math.fsum(self._values)
+            self._sum_xy = math.fsum(i * v for i, v in enumerate(self._values))
+            self._sum_y2 = math.fsum(v * v for v in self._values)
+
+    def fit(self):
+        """Return the current RegressionFit.
+
+        std_err is the standard error of the slope as reported by
+        scipy.stats.linregress; stdev is the population stdev of the
+        residuals.
+        """
+        n = self.n
+        if n < 3:
+            raise ValueError("at least 3 bars are needed for a regression fit")
+
+        mean_x = (n - 1) / 2
+        mean_y = self._sum_y / n
+        ss_x = n * (n * n - 1) / 12  # sum of (x - mean_x)^2 for consecutive x
+        ss_xy = self._sum_xy - mean_x * self._sum_y
+        ss_y = max(self._sum_y2 - mean_y * self._sum_y, 0.0)
+
+        slope = ss_xy / ss_x
+        ss_res = max(ss_y - slope * ss_xy, 0.0)
+        intercept = mean_y - slope * mean_x + self._y_ref - slope * self.first_x
+        std_err = math.sqrt(ss_res / (n - 2) / ss_x)
+        stdev = math.sqrt(ss_res / n)
+        r_squared = 1 - ss_res / ss_y if ss_y > 0 else 0.0
+        return RegressionFit(slope, intercept, std_err, stdev, r_squared, n)
+
+    def predict(self, x):
+        """Fitted price at bar x."""
+        fit = self.fit()
+        return fit.intercept + fit.slope * x
+
+
+class IncrementalExpRegression(IncrementalLinearRegression):
+    """Exponential regression over consecutive bars, updated in O(1) per bar.
+
+    The linear fit of ln(y): the same running sums of x, ln(y), x*ln(y), x^2
+    and ln(y)^2 that f_exponential_regression_from_arrays in
+    exp_regression.pine builds. fit().stdev is the population stdev of the
+    log residuals, the `_dev` of the Pine script.
+    """
+
+    def _transform(self, price):
+        return math.log(price)
+
+    def predict(self, x):
+        """Fitted price at bar x."""
+        fit = self.fit()
+        return math.exp(fit.intercept + fit.slope * x)
+
+
+def regression_arrays(prices, window=None, x_start=0, chunk_size=65536, log=True):
+    """Fit after every bar at once, vectorized over the whole series.
+
+    Element i of each RegressionFit field is the fit that
+    IncrementalExpRegression(window, x_start) would report after its update
+    with prices[i], or IncrementalLinearRegression with log=False. Entries
+    with fewer than 3 bars in the fit are NaN.
+    """
+    values = np.asarray(prices, dtype=float)
+    if log:
+        values = np.log(values)
+    size = len(values)
+    if window is not None and window < 3:
+        raise ValueError("window must be at least 3 bars")
+    if size == 0:
+        empty = np.empty(0)
+        return RegressionFit(empty, empty, empty, empty, empty, np.empty(0, dtype=int))
+
+    y_ref = values[0]
+    values = values - y_ref
+    idx = np.arange(size)
+    n = idx + 1 if window is None else np.minimum(idx + 1, window)
+    first_x = x_start + idx + 1 - n
+
+    mean_x = (n - 1) / 2
+    ss_x = n * (n * n - 1) / 12
+    if window is None:
+        sum_y = np.cumsum(values)
+        mean_y = sum_y / n
+        ss_xy = np.cumsum(idx * values) - mean_x * sum_y
+        ss_y = np.maximum(np.cumsum(values * values) - mean_y * sum_y, 0.0)
+    else:
+        # Rolling fits from differences of cumulative sums, the running sums of
+        # IncrementalLinearRegression. Like its rebuild once per window
+        # length, the sums restart for every block of `window` bars: each
+        # block sums the 2 * window - 1 values its fits can reach, with x and
+        # y taken relative to the block, so the differences keep their
+        # precision on long histories. Blocks are processed a chunk at a time.
+        blocks = -(-size // window)
+        padded = np.zeros(blocks * window + window - 1)
+        padded[window - 1:window - 1 + size] = values
+        segments = sliding_window_view(padded, 2 * window - 1)[::window]
+        x = np.arange(2 * window - 1)
+        end = window + np.arange(window)
+        n_blocks = np.concatenate((n, np.full(blocks * window - size, window))).reshape(blocks, window)
+        mean_y = np.empty(blocks * window)
+        ss_xy = np.empty(blocks * window)
+        ss_y = np.empty(blocks * window)
+        rows = max(1, chunk_size // (2 * window))
+        for start in range(0, blocks, rows):
+            block = segments[start:start + rows]
+            ref = block[:, window - 1:window]
+            y = block - ref
+            zero = np.zeros((len(block), 1))
+            sum_y = np.hstack((zero, np.cumsum(y, axis=1)))
+            sum_xy = np.hstack((zero, np.cumsum(x * y, axis=1)))
+            sum_y2 = np.hstack((zero, np.cumsum(y * y, axis=1)))
+            count = n_blocks[start:start + rows]
+            first = end - count
+            window_y = sum_y[:, end] - np.take_along_axis(sum_y, first, axis=1)
+            block_mean = window_y / count
+            window_xy = sum_xy[:, end] - np.take_along_axis(sum_xy, first, axis=1) - (first + (count - 1) / 2) * window_y
+            window_y2 = sum_y2[:, end] - np.take_along_axis(sum_y2, first, axis=1)
+            out = slice(start * window, (start + len(block)) * window)
+            mean_y[out] = (block_mean + ref).ravel()
+            ss_xy[out] = window_xy.ravel()
+            ss_y[out] = np.maximum(window_y2 - block_mean * window_y, 0.0).ravel()
+        mean_y, ss_xy, ss_y = mean_y[:size], ss_xy[:size], ss_y[:size]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = ss_xy / ss_x
+        ss_res = np.maximum(ss_y - slope * ss_xy, 0.0)
+        intercept = mean_y - slope * mean_x + y_ref - slope * first_x
+        std_err = np.sqrt(ss_res / (n - 2) / ss_x)
+        stdev = np.sqrt(ss_res / n)
+        r_squared = np.where(ss_y > 0, 1 - ss_res / ss_y, 0.0)
+
+    too_short = n < 3
+    for values in (slope, intercept, std_err, stdev, r_squared):
+        values[too_short] = np.nan
+    return RegressionFit(slope, intercept, std_err, stdev, r_squared, n)
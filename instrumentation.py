@@ -0,0 +1,231 @@
+import atexit
+import cProfile
+import json
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+# Opt-in stage timers and counters for the backtests, sweeps and the options
+# recorder. Off by default: stage() then hands back a shared no-op context,
+# so instrumented code pays one function call and a flag check.
+#
+#   PROFILE_STAGES=1        time stages and print a per-stage breakdown at exit
+#   PROFILE_TRACE=<path>    also write the stages as Chrome trace JSON
+#                           (chrome://tracing or ui.perfetto.dev)
+#   PROFILE_PSTATS=<path>   also run cProfile on the main thread and dump pstats
+#
+# The sweep and batch CLIs take --profile / --profile-trace for the same.
+# Stats are per process. The sweep and batch runners send their workers'
+# stats back with each result and merge them, so the breakdown covers the
+# whole run.
+
+MAX_TRACE_EVENTS = 1_000_000  # later events are dropped so a long recorder run stays bounded
+STAGES_KEY = '_stages'  # result key carrying a worker's collect() snapshot back to the parent for merge()
+
+_NULL_STAGE = nullcontext()
+_lock = threading.Lock()
+_enabled = False
+_trace = False
+_stages = {}  # name -> [calls, total_ns, min_ns, max_ns]
+_counters = {}
+_events = []
+_started_ns = None
+_profiler = None
+_configured = False
+
+
+def enabled():
+    return _enabled
+
+
+def enable(trace=False):
+    """Start collecting stage timings (and Chrome trace events if trace)."""
+    global _enabled, _trace, _started_ns
+    with _lock:
+        _enabled = True
+        _trace = _trace or trace
+        if _started_ns is None:
+            _started_ns = time.perf_counter_ns()
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        elapsed = end - self.start
+        with _lock:
+            stats = _stages.get(self.name)
+            if stats is None:
+                _stages[self.name] = [1, elapsed, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = min(stats[2], elapsed)
+                stats[3] = max(stats[3], elapsed)
+            if _trace and len(_events) < MAX_TRACE_EVENTS:
+                _events.append({'name': self.name, 'ph': 'X', 'ts': self.start / 1000, 'dur': elapsed / 1000,
+                                'pid': os.getpid(), 'tid': threading.get_ident()})
+        return False
+
+
+def stage(name):
+    """Context manager timing one stage; a shared no-op when instrumentation is off."""
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def count(name, n=1):
+    """Add n to a counter; does nothing when instrumentation is off."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def collect(reset=True):
+    """Picklable snapshot of this process's stats, for merge() in another process."""
+    with _lock:
+        snapshot = {'stages': {name: list(stats) for name, stats in _stages.items()},
+                    'counters': dict(_counters), 'events': list(_events)}
+        if reset:
+            _stages.clear()
+            _counters.clear()
+            _events.clear()
+    return snapshot
+
+
+def merge(snapshot):
+    """Fold a collect() snapshot from another process into this one's stats."""
+    with _lock:
+        for name, (calls, total, low, high) in snapshot['stages'].items():
+            stats = _stages.get(name)
+            if stats is None:
+                _stages[name] = [calls, total, low, high]
+            else:
+                stats[0] += calls
+                stats[1] += total
+                stats[2] = min(stats[2], low)
+                stats[3] = max(stats[3], high)
+        for name, value in snapshot['counters'].items():
+            _counters[name] = _counters.get(name, 0) + value
+        _events.extend(snapshot['events'][:max(0, MAX_TRACE_EVENTS - len(_events))])
+
+
+def report():
+    """Per-stage rows sorted by total time: name, calls, total/mean/min/max seconds."""
+    with _lock:
+        rows = [{'stage': name, 'calls': calls, 'total_seconds': total / 1e9, 'mean_seconds': total / calls / 1e9,
+                 'min_seconds': low / 1e9, 'max_seconds': high / 1e9}
+                for name, (calls, total, low, high) in _stages.items()]
+        counters = dict(_counters)
+    rows.sort(key=lambda row: row['total_seconds'], reverse=True)
+    return rows, counters
+
+
+def format_report():
+    rows, counters = report()
+    wall = (time.perf_counter_ns() - _started_ns) / 1e9 if _started_ns is not None else float('nan')
+    lines = [f"Stage breakdown ({wall:.3f}s wall in this process; worker stages run in parallel):",
+             f"{'stage':32s} {'calls':>9s} {'total s':>10s} {'mean ms':>10s} {'max ms':>10s} {'% wall':>7s}"]
+    for row in rows:
+        lines.append(f"{row['stage']:32s} {row['calls']:9d} {row['total_seconds']:10.3f} "
+                     f"{row['mean_seconds'] * 1e3:10.3f} {row['max_seconds'] * 1e3:10.3f} "
+                     f"{100 * row['total_seconds'] / wall:6.1f}%")
+    for name, value in sorted(counters.items()):
+        lines.append(f"{name:32s} {value:9d}")
+    return '\n'.join(lines)
+
+
+def dump_chrome_trace(path):
+    """Write the recorded stages in Chrome's trace event format."""
+    with _lock:
+        events = list(_events)
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def start_cprofile():
+    global _profiler
+    if _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def dump_pstats(path):
+    """Stop the cProfile run started by start_cprofile() and write its stats."""
+    global _profiler
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(path)
+        _profiler = None
+
+
+def _reset_after_fork():
+    # A forked worker starts with a copy of the parent's stats; drop them so
+    # they are not merged back twice. The lock may have been held mid-fork.
+    global _lock
+    _lock = threading.Lock()
+    _stages.clear()
+    _counters.clear()
+    _events.clear()
+
+
+def _report_at_exit(trace_path, pstats_path):
+    if pstats_path:
+        dump_pstats(pstats_path)
+    if _stages or _counters:
+        print(format_report())
+    if trace_path:
+        dump_chrome_trace(trace_path)
+
+
+def configure(trace_path=None, pstats_path=None):
+    """Turn instrumentation on for this process and the workers it starts.
+
+    The settings are exported as PROFILE_* variables so spawned workers pick
+    them up. In the main process the breakdown is printed (and the trace and
+    pstats files written) at exit.
+    """
+    global _configured
+    os.environ['PROFILE_STAGES'] = '1'
+    if trace_path:
+        os.environ['PROFILE_TRACE'] = trace_path
+    if pstats_path:
+        os.environ['PROFILE_PSTATS'] = pstats_path
+    enable(trace=bool(trace_path))
+    # Worker processes inherit the variables but only collect; their stats
+    # reach the parent through collect()/merge()
+    if _configured or multiprocessing.parent_process() is not None:
+        return
+    _configured = True
+    if pstats_path:
+        start_cprofile()
+    atexit.register(_report_at_exit, trace_path, pstats_path)
+
+
+def _configure_from_env():
+    trace_path = os.environ.get('PROFILE_TRACE')
+    pstats_path = os.environ.get('PROFILE_PSTATS')
+    if os.environ.get('PROFILE_STAGES') or trace_path or pstats_path:
+        configure(trace_path, pstats_path)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+_configure_from_env()
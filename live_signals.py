@@ -0,0 +1,283 @@
+import argparse
+import csv
+import math
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import namedtuple
+
+import instrumentation
+from channel_engine import KELLY_AFTER, WARMUP_BARS
+from incremental_regression import IncrementalExpRegression
+from logregress_channel_backtest_claude import (half_kelly_criterion, INITIAL_ACCOUNT_VALUE, MARGIN_PERCENTAGE,
+                                                SPREAD, STRATEGY_ALLOCATION)
+
+# Event-driven version of the log channel strategy for live or recorded bars.
+# Bars arrive one at a time from a generator, a CSV file being appended to, or
+# a TCP socket streaming CSV lines. The channel is kept in an
+# IncrementalExpRegression, so each bar costs O(1) instead of a refit of the
+# whole history, and the entry/exit rules, fills and Kelly sizing are those
+# of channel_engine.log_channel_kernel: fed the same bars, the engine emits
+# the trades logregress_channel_backtest_claude.backtest reports.
+#
+# A bar is acted on once it is complete. Its open and high are compared with
+# the channel fitted over the bars before it, as in the backtest.
+
+POLL_INTERVAL = 0.5  # seconds between checks of a tailed file
+
+Bar = namedtuple('Bar', ['date', 'open', 'high', 'low', 'close'])
+Signal = namedtuple('Signal', ['side', 'bar', 'date', 'price', 'shares', 'account_value'])
+
+
+class LiveLogChannel:
+    """Log channel strategy state, advanced one bar at a time.
+
+    update() returns the Signal the bar triggers, or None. At most one trade
+    happens per bar: a position opened on a bar is closed on a later one, and
+    after an exit the next entry can come on the following bar at the
+    earliest.
+    """
+
+    def __init__(self, window=None, band_mult=0.5, start_value=INITIAL_ACCOUNT_VALUE,
+                 allocation=STRATEGY_ALLOCATION, margin=MARGIN_PERCENTAGE, spread=SPREAD,
+                 kelly=half_kelly_criterion, kelly_after=KELLY_AFTER, warmup=WARMUP_BARS):
+        self.regression = IncrementalExpRegression(window=window)
+        self.band_mult = band_mult
+        self.margin = margin
+        self.spread = spread
+        self.kelly = kelly
+        self.kelly_after = kelly_after
+        self.warmup = warmup
+        self.account_value = start_value
+        self.allocation = allocation
+        self.kelly_allocation = None
+        self.bar = 0
+        self.prev_close = None
+        self.shares = 0
+        self.entry_price = None
+        self.halted = False
+        self.profits = []
+        self.losses = []
+
+    @property
+    def in_position(self):
+        return self.shares > 0
+
+    def channel(self):
+        """(center, upper, lower) for the next bar, from the fit over the bars so far."""
+        return _channel(self.regression)
+
+    def update(self, bar):
+        """Advance by one completed bar and return the Signal it triggers, if any."""
+        with instrumentation.stage('live.bar'):
+            signal = None
+            if self.bar >= self.warmup and not self.halted:
+                center, upper, lower = _channel(self.regression)
+                if self.in_position:
+                    signal = self._check_exit(bar, upper)
+                else:
+                    signal = self._check_entry(bar, center, upper, lower)
+            self.regression.update(bar.close)
+            self.prev_close = bar.close
+            self.bar += 1
+        if signal is not None:
+            instrumentation.count('live.signals')
+        return signal
+
+    def _check_entry(self, bar, center, upper, lower):
+        lower_half = (1 - self.band_mult) * center + self.band_mult * lower
+        upper_half = (1 - self.band_mult) * center + self.band_mult * upper
+        if bar.open > lower_half and self.prev_close < upper_half:
+            price = bar.open
+        elif bar.high > lower_half and bar.open < lower_half:
+            price = lower_half
+        else:
+            return None
+
+        # Kelly is refreshed at the end of every bar after kelly_after
+        if self.kelly_allocation is not None and self.bar - 1 > self.kelly_after:
+            self.allocation = self.kelly_allocation
+        shares = int((self.account_value * self.allocation * (1 + self.margin)) / price)
+        self.account_value -= shares * price * (1 + self.spread)
+        if shares < 0:
+            # A negative account value leaves a short position that the
+            # strategy never trades out of; the backtest stops here too
+            self.halted = True
+        elif shares > 0:
+            self.shares = shares
+            self.entry_price = price
+        return Signal('buy', self.bar, bar.date, price, shares, self.account_value)
+
+    def _check_exit(self, bar, upper):
+        if not (bar.open > upper or (bar.high > upper and bar.open < upper)):
+            return None
+        price = min(bar.open, upper)
+        shares = self.shares
+        revenue = shares * price * (1 - self.spread)
+        profit = revenue - shares * self.entry_price
+        self.account_value += revenue
+        (self.profits if profit > 0 else self.losses).append(profit)
+        self.shares = 0
+        self.entry_price = None
+
+        if self.profits and self.losses:
+            avg_profit = sum(self.profits) / len(self.profits)
+            avg_loss = abs(sum(self.losses) / len(self.losses))
+            win_ratio = len(self.profits) / (len(self.profits) + len(self.losses))
+            self.kelly_allocation = self.kelly(avg_profit, avg_loss, win_ratio)
+        return Signal('sell', self.bar, bar.date, price, shares, self.account_value)
+
+
+def _channel(regression):
+    # Same bands as channel_engine.log_channel_bands at the next bar, with
+    # math.exp instead of NumPy for the per-bar cost
+    fit = regression.fit()
+    log_center = fit.slope * regression.last_x + fit.intercept
+    return math.exp(log_center), math.exp(log_center + fit.std_err), math.exp(log_center - fit.std_err)
+
+
+def run(bars, engine=None, on_signal=None, **options):
+    """Feed bars through an engine (a new LiveLogChannel by default), calling on_signal for each signal.
+
+    Returns the engine, so a caller can keep feeding it afterwards.
+    """
+    engine = engine or LiveLogChannel(**options)
+    for bar in bars:
+        signal = engine.update(bar)
+        if signal is not None and on_signal is not None:
+            on_signal(signal)
+    return engine
+
+
+def parse_csv_lines(lines, date_column='date'):
+    """Bars from an iterable of CSV lines whose first line is the header."""
+    lines = iter(lines)
+    header = next(csv.reader([next(lines)]))
+    columns = [name.strip().lower() for name in header]
+    positions = [columns.index(name) for name in (date_column, 'open', 'high', 'low', 'close')]
+    for line in lines:
+        if not line.strip():
+            continue
+        row = next(csv.reader([line]))
+        date, open_, high, low, close = (row[i] for i in positions)
+        yield Bar(date, float(open_), float(high), float(low), float(close))
+
+
+def tail_lines(path, poll_interval=POLL_INTERVAL, follow=True, stop=None):
+    """Lines of a text file, then the lines appended to it, like tail -f.
+
+    A partially written last line is held back until its newline arrives.
+    With follow=False it stops at the end of the file; otherwise it polls
+    until the stop event (if given) is set.
+    """
+    with open(path, newline='') as f:
+        pending = ''
+        while True:
+            chunk = f.readline()
+            if chunk:
+                pending += chunk
+                if pending.endswith('\n'):
+                    yield pending
+                    pending = ''
+                continue
+            if not follow or (stop is not None and stop.is_set()):
+                break
+            time.sleep(poll_interval)
+        if pending:
+            yield pending
+
+
+def socket_lines(host, port, timeout=None):
+    """Lines received on a TCP connection until the peer closes it."""
+    with socket.create_connection((host, port), timeout=timeout) as conn:
+        with conn.makefile('r', newline='') as stream:
+            yield from stream
+
+
+class BarReplayServer(socketserver.ThreadingTCPServer):
+    """Local stand-in for a live bar feed: streams a CSV file to each client, one line every `interval` seconds."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, csv_path, interval=0.0):
+        super().__init__(address, _BarReplayHandler)
+        self.csv_path = csv_path
+        self.interval = interval
+
+
+class _BarReplayHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        with open(self.server.csv_path, 'rb') as f:
+            for line in f:
+                try:
+                    self.wfile.write(line)
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                if self.server.interval:
+                    time.sleep(self.server.interval)
+
+
+def serve_bars_in_thread(csv_path, port=0, interval=0.0):
+    """Start a BarReplayServer on a background thread; port 0 picks a free port."""
+    server = BarReplayServer(('127.0.0.1', port), csv_path, interval)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def print_signal(signal):
+    print(f"{signal.date} bar {signal.bar}: {signal.side.upper()} {signal.shares} @ {signal.price:.4f}, "
+          f"account value {signal.account_value:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the log channel strategy on streaming bars")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--file', help="CSV of bars; with --follow, keep reading rows appended to it")
+    source.add_argument('--connect', metavar='HOST:PORT', help="read CSV lines from a TCP bar feed")
+    source.add_argument('--replay', metavar='CSV', help="stream a CSV through a local stand-in feed")
+    parser.add_argument('--follow', action='store_true', help="keep tailing --file after its last row")
+    parser.add_argument('--interval', type=float, default=0.0, help="seconds between bars for --replay")
+    parser.add_argument('--date-column', default='date')
+    parser.add_argument('--window', type=int, help="rolling regression window in bars; default expanding")
+    parser.add_argument('--band-mult', type=float, default=0.5)
+    parser.add_argument('--signals-csv', help="append signals to this CSV file")
+    args = parser.parse_args()
+
+    if args.file:
+        lines = tail_lines(args.file, follow=args.follow)
+    elif args.connect:
+        host, port = args.connect.rsplit(':', 1)
+        lines = socket_lines(host, int(port))
+    else:
+        server = serve_bars_in_thread(args.replay, interval=args.interval)
+        lines = socket_lines(*server.server_address)
+
+    handlers = [print_signal]
+    if args.signals_csv:
+        new_file = not os.path.exists(args.signals_csv)
+        signals_file = open(args.signals_csv, 'a', newline='')
+        signals_writer = csv.writer(signals_file)
+        if new_file:
+            signals_writer.writerow(Signal._fields)
+
+        def write_signal(signal):
+            signals_writer.writerow(signal)
+            signals_file.flush()
+        handlers.append(write_signal)
+
+    def on_signal(signal):
+        for handler in handlers:
+            handler(signal)
+
+    engine = LiveLogChannel(window=args.window, band_mult=args.band_mult)
+    try:
+        run(parse_csv_lines(lines, args.date_column), engine, on_signal)
+    except KeyboardInterrupt:
+        pass
+    print(f"{engine.bar} bars, account value {engine.account_value:.2f}, "
+          f"{'holding ' + str(engine.shares) + ' shares' if engine.in_position else 'flat'}")
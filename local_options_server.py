@@ -0,0 +1,169 @@
+import argparse
+import json
+import random
+import secrets
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from storage_benchmark import synthetic_option_chain
+
+# Local stand-in for the broker's options chain endpoint, for exercising the
+# fetcher without touching the real API. It serves synthetic chains at
+# /options-chain/<symbol> with configurable latency, a request budget that
+# answers 429 with Retry-After once exceeded, and random 503 failures.
+# POST /oauth2/token answers refresh_token grants with short-lived access
+# tokens, for exercising token_store.TokenManager.
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.1, jitter=0.05, requests_per_second=None, error_rate=0.0,
+                 expiries=4, strikes=20, token_lifetime=1800, require_token=False):
+        super().__init__(address, StandInHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.requests_per_second = requests_per_second
+        self.error_rate = error_rate
+        self.expiries = expiries
+        self.strikes = strikes
+        self.token_lifetime = token_lifetime
+        self.require_token = require_token
+        self.counts = {'requests': 0, 'ok': 0, 'throttled': 0, 'errors': 0, 'unauthorized': 0, 'token_refreshes': 0}
+        self.refresh_tokens = set()
+        self.access_tokens = {}  # access token -> expiry (monotonic)
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+
+    def throttled(self):
+        # Fixed one-second windows, like a simple server-side budget
+        if self.requests_per_second is None:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1:
+                self._window_start = now
+                self._window_requests = 0
+            self._window_requests += 1
+            return self._window_requests > self.requests_per_second
+
+    def issue_token(self, refresh_token=None):
+        """A new token response; refresh_token=None starts a new login."""
+        with self._lock:
+            if refresh_token is None:
+                refresh_token = secrets.token_hex(16)
+                self.refresh_tokens.add(refresh_token)
+            elif refresh_token not in self.refresh_tokens:
+                return None
+            access_token = secrets.token_hex(16)
+            self.access_tokens[access_token] = time.monotonic() + self.token_lifetime
+        return {'access_token': access_token, 'refresh_token': refresh_token, 'token_type': 'Bearer',
+                'expires_in': self.token_lifetime}
+
+    def authorized(self, header):
+        if not self.require_token:
+            return True
+        access_token = (header or '').removeprefix('Bearer ')
+        with self._lock:
+            return self.access_tokens.get(access_token, 0) > time.monotonic()
+
+    def count(self, key):
+        with self._lock:
+            self.counts['requests'] += 1
+            self.counts[key] += 1
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] != 'options-chain':
+            self.send_error(404)
+            return
+        if not server.authorized(self.headers.get('Authorization')):
+            server.count('unauthorized')
+            self.send_error(401)
+            return
+        if server.throttled():
+            server.count('throttled')
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.end_headers()
+            return
+
+        time.sleep(max(0.0, random.gauss(server.latency, server.jitter)))
+        if random.random() < server.error_rate:
+            server.count('errors')
+            self.send_error(503)
+            return
+
+        symbol = parts[1]
+        underlying = 50 + (sum(map(ord, symbol)) % 450)
+        chain = synthetic_option_chain(symbol, underlying, datetime.now(), server.expiries, server.strikes)
+        body = json.dumps(chain).encode()
+        server.count('ok')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        if self.path.rstrip('/') != '/oauth2/token':
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        token = None
+        if form.get('grant_type') == ['refresh_token']:
+            token = server.issue_token(form.get('refresh_token', [''])[0])
+        if token is None:
+            self._send_json(400, {'error': 'invalid_grant'})
+            return
+        server.count('token_refreshes')
+        self._send_json(200, token)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_in_thread(port=0, **options):
+    """Start a StandInServer on a background thread; port 0 picks a free port."""
+    server = StandInServer(('127.0.0.1', port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic options chains locally")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.1, help="mean response latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--requests-per-second', type=int, help="answer 429 above this rate")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument('--token-lifetime', type=int, default=1800, help="access token lifetime in seconds")
+    parser.add_argument('--require-token', action='store_true', help="answer 401 without a valid bearer token")
+    args = parser.parse_args()
+
+    server = StandInServer(('127.0.0.1', args.port), latency=args.latency, jitter=args.jitter,
+                           requests_per_second=args.requests_per_second, error_rate=args.error_rate,
+                           token_lifetime=args.token_lifetime, require_token=args.require_token)
+    print(f"Serving on http://127.0.0.1:{args.port}/options-chain/<symbol>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(server.counts)
@@ -0,0 +1,170 @@
+import csv
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+# US equity market sessions from a local calendar, so the recorder needs no
+# network lookups or calendar packages. Holidays and 1:00 p.m. early closes
+# follow the NYSE rules; one-off closures (national days of mourning and the
+# like) can be added from a CSV file. Sessions are built once per year and
+# kept as UTC datetimes, so checking the clock is a dictionary lookup and a
+# comparison rather than timezone construction on every call.
+
+TIMEZONE = 'America/New_York'
+OPEN_TIME = time(9, 30)
+CLOSE_TIME = time(16, 0)
+EARLY_CLOSE_TIME = time(13, 0)
+
+UTC = ZoneInfo('UTC')
+
+
+def _nth_weekday(year, month, weekday, n):
+    # n-th given weekday (Monday = 0) of the month; n = -1 for the last one
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    # Anonymous Gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _observed(day):
+    # Saturday holidays move to Friday and Sunday holidays to Monday
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def nyse_holidays(year):
+    """Full-day NYSE holidays of a year."""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)),
+    }
+    # New Year's Day on a Saturday is not moved back into the old year
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return holidays
+
+
+def nyse_early_closes(year):
+    """Days the NYSE closes at 1:00 p.m.: before Independence Day, after Thanksgiving and Christmas Eve."""
+    early = {_nth_weekday(year, 11, 3, 4) + timedelta(days=1)}
+    july_3 = date(year, 7, 3)
+    if july_3.weekday() < 4:  # Independence Day on Tuesday to Friday
+        early.add(july_3)
+    christmas_eve = date(year, 12, 24)
+    if christmas_eve.weekday() < 5:
+        early.add(christmas_eve)
+    return early - nyse_holidays(year)
+
+
+def read_calendar_file(path):
+    """One-off closures from a CSV of date,close rows.
+
+    close is 'closed' for a full-day closure or an HH:MM early close time.
+    Returns {date: None or close time}, the overrides MarketCalendar takes.
+    """
+    overrides = {}
+    try:
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                day = date.fromisoformat(row['date'].strip())
+                close = row['close'].strip().lower()
+                overrides[day] = None if close == 'closed' else time.fromisoformat(close)
+    except FileNotFoundError as e:
+        print(f"Error: {path} not found: {e}")
+    return overrides
+
+
+class MarketCalendar:
+    """Trading sessions in one timezone, built a year at a time and cached.
+
+    overrides maps a date to None (closed) or its close time, on top of the
+    NYSE holidays and early closes.
+    """
+
+    def __init__(self, timezone=TIMEZONE, open_time=OPEN_TIME, close_time=CLOSE_TIME,
+                 early_close_time=EARLY_CLOSE_TIME, overrides=None):
+        self.tz = ZoneInfo(timezone)
+        self.open_time = open_time
+        self.close_time = close_time
+        self.early_close_time = early_close_time
+        self.overrides = dict(overrides or {})
+        self._years = {}  # year -> {date: (open, close) in UTC}
+
+    def _sessions_of_year(self, year):
+        sessions = self._years.get(year)
+        if sessions is None:
+            holidays = nyse_holidays(year)
+            early = nyse_early_closes(year)
+            sessions = {}
+            day = date(year, 1, 1)
+            while day.year == year:
+                if day.weekday() < 5 and day not in holidays:
+                    close = self.early_close_time if day in early else self.close_time
+                    if day in self.overrides:
+                        close = self.overrides[day]
+                    if close is not None:
+                        sessions[day] = (datetime.combine(day, self.open_time, self.tz).astimezone(UTC),
+                                         datetime.combine(day, close, self.tz).astimezone(UTC))
+                day += timedelta(days=1)
+            self._years[year] = sessions
+        return sessions
+
+    def session(self, day):
+        """(open, close) UTC datetimes of a date's session, or None if the market is closed that day."""
+        return self._sessions_of_year(day.year).get(day)
+
+    def local_date(self, moment):
+        return moment.astimezone(self.tz).date()
+
+    def is_open(self, moment=None):
+        """Whether moment (default now) falls within a session, open and close included."""
+        moment = moment or datetime.now(UTC)
+        session = self.session(self.local_date(moment))
+        return session is not None and session[0] <= moment <= session[1]
+
+    def next_session(self, moment=None):
+        """(open, close) of the session in progress at moment, or the next one to start."""
+        moment = moment or datetime.now(UTC)
+        day = self.local_date(moment)
+        # Any two weeks hold a session; the bound only guards against overrides closing everything
+        for _ in range(366):
+            session = self.session(day)
+            if session is not None and moment <= session[1]:
+                return session
+            day += timedelta(days=1)
+        raise ValueError(f"no market session within a year of {moment}")
+
+    def sessions(self, start, end):
+        """(open, close) of every session on local dates start..end inclusive."""
+        result = []
+        for year in range(start.year, end.year + 1):
+            result.extend(session for day, session in sorted(self._sessions_of_year(year).items())
+                          if start <= day <= end)
+        return result
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Shared OHLCV loader for the backtests, sweeps and charts. The first load
+# of a CSV parses it in chunks into one .npy file per column under the
+# cache directory; later loads memory-map those files instead of re-parsing
+# text and dates. Cache entries are keyed by the source's path, mtime and
+# size, so editing or replacing a CSV rebuilds its entry.
+
+CACHE_DIR = os.environ.get('MARKET_DATA_CACHE_DIR', os.path.expanduser('~/.cache/market_data'))
+CHUNK_ROWS = 1_000_000  # CSV rows parsed at a time when building a cache entry
+META_FILE = 'meta.json'
+
+
+def _source_key(path):
+    path = os.path.abspath(path)
+    return hashlib.sha1(path.encode()).hexdigest()[:16]
+
+
+def _settings_key(date_column, sort):
+    return hashlib.sha1(f"{date_column}:{sort}".encode()).hexdigest()[:8]
+
+
+def cache_path(path, date_column='date', sort=True, cache_dir=None):
+    """Cache entry directory for a CSV as it is on disk right now.
+
+    Named <source>-<settings>-<version>: loads of the same file with other
+    date_column/sort settings get their own entries.
+    """
+    stat = os.stat(path)
+    version = f"{stat.st_mtime_ns}:{stat.st_size}"
+    return os.path.join(cache_dir or CACHE_DIR,
+                        f"{_source_key(path)}-{_settings_key(date_column, sort)}-"
+                        f"{hashlib.sha1(version.encode()).hexdigest()[:16]}")
+
+
+def read_csv_chunks(path, chunk_rows=CHUNK_ROWS, date_column='date', columns=None):
+    """Parse a CSV chunk by chunk, for files too large to read at once.
+
+    date_column is parsed to datetime64 when the file has it.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    parse_dates = [date_column] if date_column in header else None
+    yield from pd.read_csv(path, chunksize=chunk_rows, parse_dates=parse_dates, usecols=columns)
+
+
+def _count_rows(path):
+    # Upper bound on the data rows (blank lines count too); used to size the memmaps
+    lines = 0
+    last = b''
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last and last != b'\n':
+        lines += 1  # no newline after the last row
+    return max(lines - 1, 0)
+
+
+def _build_cache(path, target, date_column, sort, chunk_rows):
+    # Numeric and date columns are written straight into preallocated .npy
+    # memmaps chunk by chunk, so memory stays at one chunk (plus one column
+    # when sorting). Numeric columns are stored as float64 so a missing value
+    # in a later chunk is still NaN; text columns other than date_column are
+    # not cached.
+    rows = _count_rows(path)
+    parent = os.path.dirname(target)
+    os.makedirs(parent, exist_ok=True)
+    building = tempfile.mkdtemp(dir=parent, prefix='.building-')
+    try:
+        arrays = {}
+        offset = 0
+        for chunk in read_csv_chunks(path, chunk_rows, date_column):
+            if not arrays:
+                for column in chunk.columns:
+                    if column == date_column:
+                        dtype = 'datetime64[ns]'
+                    elif pd.api.types.is_numeric_dtype(chunk[column].dtype):
+                        dtype = np.float64
+                    else:
+                        continue
+                    arrays[column] = np.lib.format.open_memmap(os.path.join(building, f"{len(arrays)}.npy"),
+                                                               mode='w+', dtype=dtype, shape=(rows,))
+            for column, array in arrays.items():
+                array[offset:offset + len(chunk)] = chunk[column].to_numpy(dtype=array.dtype)
+            offset += len(chunk)
+        rows = offset
+
+        if sort and date_column in arrays:
+            order = np.argsort(arrays[date_column][:rows], kind='stable')
+            if np.any(np.diff(order) != 1):
+                for array in arrays.values():
+                    array[:rows] = array[:rows][order]
+        for array in arrays.values():
+            array.flush()
+
+        meta = {'source': os.path.abspath(path), 'rows': rows, 'date_column': date_column,
+                'columns': {column: f"{i}.npy" for i, column in enumerate(arrays)}}
+        with open(os.path.join(building, META_FILE), 'w') as f:
+            json.dump(meta, f)
+        try:
+            os.rename(building, target)
+        except OSError:
+            # Another process finished the same entry first; use theirs
+            shutil.rmtree(building, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(building, ignore_errors=True)
+        raise
+
+    # Drop entries for older versions of the same file loaded with the same
+    # settings, and entries in the earlier <source>-<version> layout; entries
+    # for other settings belong to other loaders and stay
+    source, settings, _ = os.path.basename(target).split('-')
+    for name in os.listdir(parent):
+        entry = os.path.join(parent, name)
+        parts = name.split('-')
+        stale = parts[0] == source and (len(parts) == 2 or (len(parts) == 3 and parts[1] == settings))
+        if stale and entry != target:
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def load_columns(path, columns=None, date_column='date', sort=True, cache_dir=None, chunk_rows=CHUNK_ROWS):
+    """Columns of an OHLCV CSV as read-only memory-mapped arrays, building the cache entry if needed.
+
+    date_column, when the file has it, is parsed to datetime64[ns] and with
+    sort=True the rows are put in date order. Returns {column: array}.
+    """
+    target = cache_path(path, date_column, sort, cache_dir)
+    meta_path = os.path.join(target, META_FILE)
+    if not os.path.exists(meta_path):
+        _build_cache(path, target, date_column, sort, chunk_rows)
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    files = meta['columns']
+    if columns is None:
+        columns = list(files)
+    missing = [column for column in columns if column not in files]
+    if missing:
+        raise KeyError(f"{path} has no numeric or date columns {missing}")
+    return {column: np.load(os.path.join(target, files[column]), mmap_mode='r')[:meta['rows']] for column in columns}
+
+
+def load_frame(path, columns=None, date_column='date', sort=True, index=False, cache_dir=None):
+    """load_columns as a DataFrame, optionally indexed by date_column."""
+    arrays = load_columns(path, columns, date_column, sort, cache_dir)
+    data = pd.DataFrame(arrays, copy=False)
+    if index:
+        data = data.set_index(date_column)
+    return data
+
+
+def iter_chunks(path, columns=None, chunk_rows=CHUNK_ROWS, date_column='date', sort=True, cache_dir=None):
+    """Yield {column: array slice} chunks of the cached columns, for scans larger than memory."""
+    arrays = load_columns(path, columns, date_column, sort, cache_dir)
+    rows = len(next(iter(arrays.values()))) if arrays else 0
+    for start in range(0, rows, chunk_rows):
+        yield {column: array[start:start + chunk_rows] for column, array in arrays.items()}
@@ -0,0 +1,209 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Performance metrics shared by the backtests, sweeps, batch runs and
+# walk-forward evaluation. Everything works on NumPy arrays of per-bar
+# account values in one or two vectorized passes, so a sweep can summarize
+# every run without the metrics showing up in its profile.
+#
+# Ratios are annualized with periods_per_year (252 for daily bars).
+# Drawdowns are fractions of the running peak (-0.25 is a 25% drawdown) and
+# durations are in bars.
+
+PERIODS_PER_YEAR = 252
+
+
+def simple_returns(equity):
+    equity = np.asarray(equity, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.diff(equity) / equity[:-1]
+
+
+def sharpe_ratio(returns, periods_per_year=PERIODS_PER_YEAR):
+    """Annualized mean over standard deviation of per-period returns."""
+    returns = np.asarray(returns, dtype=float)
+    if len(returns) == 0:
+        return np.nan
+    std = returns.std()
+    if not std > 0:
+        return np.nan
+    return np.sqrt(periods_per_year) * returns.mean() / std
+
+
+def sortino_ratio(returns, periods_per_year=PERIODS_PER_YEAR):
+    """Annualized mean over downside deviation, the RMS of the negative returns over all periods."""
+    returns = np.asarray(returns, dtype=float)
+    if len(returns) == 0:
+        return np.nan
+    mean = returns.mean()
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+    if not downside > 0:
+        return np.inf if mean > 0 else np.nan
+    return np.sqrt(periods_per_year) * mean / downside
+
+
+def drawdown(equity):
+    """Drawdown from the running peak at every bar."""
+    equity = np.asarray(equity, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return equity / np.maximum.accumulate(equity) - 1
+
+
+def max_drawdown(equity):
+    """(depth, duration) of the deepest drawdown.
+
+    Duration counts the bars from the peak before the trough until the
+    equity first gets back to that peak, or until the last bar if it never
+    does.
+    """
+    equity = np.asarray(equity, dtype=float)
+    if len(equity) == 0:
+        return np.nan, 0
+    underwater = drawdown(equity)
+    trough = int(np.nanargmin(underwater)) if not np.all(np.isnan(underwater)) else 0
+    depth = underwater[trough]
+    if not depth < 0:
+        return 0.0, 0
+    peaks = np.flatnonzero(underwater >= 0)
+    k = np.searchsorted(peaks, trough)
+    peak = peaks[k - 1] if k > 0 else 0
+    recovery = peaks[k] if k < len(peaks) else len(equity) - 1
+    return float(depth), int(recovery - peak)
+
+
+def cagr(equity, periods_per_year=PERIODS_PER_YEAR):
+    """Compound annual growth rate from the first to the last value; NaN if either is not positive."""
+    equity = np.asarray(equity, dtype=float)
+    if len(equity) < 2 or not (equity[0] > 0 and equity[-1] > 0):
+        return np.nan
+    years = (len(equity) - 1) / periods_per_year
+    return (equity[-1] / equity[0]) ** (1 / years) - 1
+
+
+def in_market(entry_bars, exit_bars, size, start=0):
+    """Boolean position mask over bars start..size-1 from matching entry and exit bars.
+
+    A position counts from its entry bar up to, but not including, its exit
+    bar; an entry without an exit stays open to the end.
+    """
+    change = np.zeros(size - start + 1, dtype=np.int64)
+    np.add.at(change, np.asarray(entry_bars, dtype=np.int64) - start, 1)
+    np.add.at(change, np.asarray(exit_bars, dtype=np.int64) - start, -1)
+    return np.cumsum(change[:-1]) > 0
+
+
+def exposure(positions):
+    """Fraction of bars with a position."""
+    positions = np.asarray(positions)
+    return float(np.mean(positions != 0)) if len(positions) else np.nan
+
+
+def turnover(positions, periods_per_year=PERIODS_PER_YEAR):
+    """Annualized sum of absolute position changes, in units of the position.
+
+    For an all-in/all-out strategy this is twice the round trips per year.
+    """
+    positions = np.asarray(positions, dtype=float)
+    if len(positions) < 2:
+        return np.nan
+    changes = np.abs(np.diff(positions, prepend=0.0)).sum()
+    return changes * periods_per_year / len(positions)
+
+
+def trade_statistics(pnl):
+    """Win rate, average win/loss, profit factor and expectancy of closed trades' profit and loss."""
+    pnl = np.asarray(pnl, dtype=float)
+    wins = pnl[pnl > 0]
+    losses = pnl[pnl <= 0]
+    gross_loss = -losses.sum()
+    return {
+        'closed_trades': len(pnl),
+        'win_rate': len(wins) / len(pnl) if len(pnl) else np.nan,
+        'avg_win': wins.mean() if len(wins) else np.nan,
+        'avg_loss': losses.mean() if len(losses) else np.nan,
+        'largest_win': wins.max() if len(wins) else np.nan,
+        'largest_loss': losses.min() if len(losses) else np.nan,
+        'profit_factor': wins.sum() / gross_loss if gross_loss > 0 else (np.inf if len(wins) else np.nan),
+        'expectancy': pnl.mean() if len(pnl) else np.nan,
+    }
+
+
+def summarize(equity, trade_count=None, periods_per_year=PERIODS_PER_YEAR, trade_pnl=None, positions=None):
+    """Headline metrics of an equity curve as a flat dict.
+
+    Exposure and turnover are included when a position array is given, and
+    trade statistics when the closed trades' profits and losses are.
+    """
+    equity = np.asarray(equity, dtype=float)
+    returns = simple_returns(equity)
+    depth, duration = max_drawdown(equity)
+    summary = {
+        'sharpe': sharpe_ratio(returns, periods_per_year),
+        'sortino': sortino_ratio(returns, periods_per_year),
+        'max_drawdown': depth,
+        'max_drawdown_duration': duration,
+        'cagr': cagr(equity, periods_per_year),
+        'volatility': returns.std() * np.sqrt(periods_per_year) if len(returns) else np.nan,
+        'final_equity': equity[-1] if len(equity) else np.nan,
+    }
+    if trade_count is not None:
+        summary['trades'] = trade_count
+    if positions is not None:
+        summary['exposure'] = exposure(positions)
+        summary['turnover'] = turnover(positions, periods_per_year)
+    if trade_pnl is not None:
+        summary.update(trade_statistics(trade_pnl))
+    return summary
+
+
+def _rolling_sum(values, window):
+    sums = np.cumsum(np.concatenate(([0.0], values)))
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = sums[window:] - sums[:-window]
+    return out
+
+
+def rolling_volatility(returns, window, periods_per_year=PERIODS_PER_YEAR):
+    """Annualized standard deviation of the last `window` returns at each bar; NaN until full."""
+    returns = np.asarray(returns, dtype=float)
+    mean = _rolling_sum(returns, window) / window
+    variance = np.maximum(_rolling_sum(returns * returns, window) / window - mean * mean, 0.0)
+    return np.sqrt(variance * periods_per_year)
+
+
+def rolling_sharpe(returns, window, periods_per_year=PERIODS_PER_YEAR):
+    """Sharpe ratio over the last `window` returns at each bar."""
+    returns = np.asarray(returns, dtype=float)
+    mean = _rolling_sum(returns, window) / window
+    volatility = rolling_volatility(returns, window, periods_per_year)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(volatility > 0, mean * periods_per_year / volatility, np.nan)
+
+
+def rolling_sortino(returns, window, periods_per_year=PERIODS_PER_YEAR):
+    """Sortino ratio over the last `window` returns at each bar."""
+    returns = np.asarray(returns, dtype=float)
+    mean = _rolling_sum(returns, window) / window
+    downside = np.sqrt(_rolling_sum(np.minimum(returns, 0.0) ** 2, window) / window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(downside > 0, np.sqrt(periods_per_year) * mean / downside, np.nan)
+
+
+def rolling_max_drawdown(equity, window, chunk_size=1 << 22):
+    """Deepest drawdown within the last `window` values at each bar; NaN until full.
+
+    Costs O(len * window), evaluated over blocks of windows to bound memory.
+    """
+    equity = np.asarray(equity, dtype=float)
+    out = np.full(len(equity), np.nan)
+    if len(equity) < window:
+        return out
+    views = sliding_window_view(equity, window)
+    rows = max(1, chunk_size // window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, len(views), rows):
+            block = views[start:start + rows]
+            out[window - 1 + start:window - 1 + start + len(block)] = \
+                (block / np.maximum.accumulate(block, axis=1) - 1).min(axis=1)
+    return out
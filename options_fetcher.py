@@ -0,0 +1,182 @@
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import instrumentation
+
+# Concurrent options chain fetching: a bounded thread pool sharing one pooled
+# keep-alive session, a client-side rate limiter that keeps the whole pool
+# inside the broker's request budget, and jittered retries on throttling and
+# server errors. fetch_all keeps only a bounded number of fetches ahead of
+# its consumer, so the writer's full queue throttles fetching.
+
+OPTIONS_CHAIN_URL = 'https://api.schwab.com/options-chain/{symbol}'  # Placeholder
+
+# Defaults sized for the broker's request budget
+FETCH_CONCURRENCY = 16
+REQUESTS_PER_MINUTE = 120
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30
+REQUEST_TIMEOUT = 10
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Token bucket shared by all fetch threads.
+
+    Allows `rate` requests per `per` seconds on average with bursts of up to
+    `burst` requests.
+    """
+
+    def __init__(self, rate, per=60.0, burst=None):
+        self.interval = per / rate
+        self.capacity = burst if burst is not None else max(1, rate // 10)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) / self.interval)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * self.interval
+            time.sleep(wait)
+
+
+class _TokenError(Exception):
+    pass
+
+
+class OptionsChainFetcher:
+    """Fetches options chains for many symbols concurrently.
+
+    access_token is a callable returning the current bearer token, read on
+    every request so a refreshed token is picked up immediately.
+    """
+
+    def __init__(self, access_token, url=OPTIONS_CHAIN_URL, concurrency=FETCH_CONCURRENCY,
+                 requests_per_minute=REQUESTS_PER_MINUTE, burst=None, max_retries=MAX_RETRIES,
+                 backoff=BACKOFF_SECONDS, max_backoff=MAX_BACKOFF_SECONDS, timeout=REQUEST_TIMEOUT):
+        self.access_token = access_token
+        self.url = url
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(requests_per_minute, per=60.0, burst=burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='options-fetch')
+
+    def _retry_delay(self, attempt, response=None):
+        # Full jitter on an exponential backoff, but never sooner than the
+        # server's Retry-After
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+        return delay
+
+    def fetch(self, symbol):
+        """Fetch one chain, retrying throttled and failed requests. Returns None on failure."""
+        url = self.url.format(symbol=symbol)
+        for attempt in range(self.max_retries + 1):
+            with instrumentation.stage('recorder.rate_limit_wait'):
+                self.rate_limiter.acquire()
+            response = None
+            try:
+                # A failed token refresh (endpoint error, network) is retried like a failed request
+                try:
+                    token = self.access_token()
+                except Exception as e:
+                    raise _TokenError(e) from e
+                headers = {
+                    'Authorization': f"Bearer {token}",
+                    'Content-Type': 'application/json'
+                }
+                with instrumentation.stage('recorder.fetch'):
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    with instrumentation.stage('recorder.parse'):
+                        return response.json()
+                error = f"HTTP {response.status_code}"
+            except _TokenError as e:
+                error = f"token refresh failed: {e}"
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = str(e)
+            except requests.exceptions.RequestException as e:
+                print(f"Error fetching data for {symbol}: {e}")
+                return None
+
+            if attempt < self.max_retries:
+                instrumentation.count('recorder.fetch_retries')
+                time.sleep(self._retry_delay(attempt, response))
+
+        instrumentation.count('recorder.fetch_failures')
+        print(f"Error fetching data for {symbol}: {error} after {self.max_retries + 1} attempts")
+        return None
+
+    def fetch_all(self, symbols, max_in_flight=None):
+        """Fetch every symbol concurrently, yielding (symbol, chain or None) as each finishes.
+
+        At most max_in_flight (default twice the concurrency) fetches are
+        submitted but not yet consumed, so a consumer blocked on a full
+        writer queue stops new fetches instead of letting chains pile up in
+        finished futures.
+        """
+        max_in_flight = max_in_flight or 2 * self.concurrency
+        symbols = iter(symbols)
+        futures = {}
+        while True:
+            for symbol in symbols:
+                futures[self._executor.submit(self.fetch, symbol)] = symbol
+                if len(futures) >= max_in_flight:
+                    break
+            if not futures:
+                return
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield futures.pop(future), future.result()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch options chains concurrently, e.g. from local_options_server.py")
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--url', default='http://127.0.0.1:8080/options-chain/{symbol}')
+    parser.add_argument('--token', default='local')
+    parser.add_argument('--concurrency', type=int, default=FETCH_CONCURRENCY)
+    parser.add_argument('--requests-per-minute', type=int, default=REQUESTS_PER_MINUTE)
+    args = parser.parse_args()
+
+    fetcher = OptionsChainFetcher(lambda: args.token, url=args.url, concurrency=args.concurrency,
+                                  requests_per_minute=args.requests_per_minute)
+    start = time.perf_counter()
+    fetched = sum(1 for _, chain in fetcher.fetch_all(args.symbols) if chain is not None)
+    fetcher.close()
+    print(f"Fetched {fetched}/{len(args.symbols)} chains in {time.perf_counter() - start:.2f}s")
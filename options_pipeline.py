@@ -0,0 +1,221 @@
+import os
+import pickle
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import instrumentation
+
+# Writer stage of the options recorder. Fetchers put snapshots on a
+# bounded queue and keep going; one writer thread drains it and stores each
+# flush interval's snapshots with a single storage.save_many call. A full
+# queue blocks the fetchers, which is the pipeline's backpressure.
+#
+# A batch that fails to save is retried with a backoff. If it still fails,
+# its snapshots are saved one at a time, so one malformed chain does not
+# hold back the rest of the batch. Those that fail on their own are pickled
+# to the spill directory, if one is set, and tried again when the next
+# writer on that directory starts, so a storage outage loses nothing.
+
+MAX_QUEUE_SIZE = 1000
+FLUSH_INTERVAL = 5.0  # seconds
+MAX_BATCH_SIZE = 500
+WRITE_RETRIES = 3
+WRITE_BACKOFF_SECONDS = 1.0  # doubled after each failed attempt
+
+_STOP = object()
+
+
+class SnapshotWriter:
+    """Batches queued snapshots into storage.save_many calls on a writer thread."""
+
+    def __init__(self, storage, max_queue=MAX_QUEUE_SIZE, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH_SIZE,
+                 spill_dir=None, retries=WRITE_RETRIES, backoff=WRITE_BACKOFF_SECONDS):
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.spill_dir = spill_dir
+        self.retries = retries
+        self.backoff = backoff
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'failed': 0,
+            'spilled': 0,
+            'write_retries': 0,
+            'batches': 0,
+            'max_queue_depth': 0,
+            'put_wait_seconds': 0.0,
+            'write_seconds': 0.0,
+            'last_batch_size': 0,
+            'last_write_seconds': 0.0,
+            'last_write_lag_seconds': 0.0,
+            'max_write_lag_seconds': 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name='options-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, symbol, options_chain_data, timestamp=None):
+        """Queue a snapshot for writing, blocking while the queue is full."""
+        start = time.monotonic()
+        with instrumentation.stage('recorder.enqueue'):
+            self._queue.put((symbol, options_chain_data, timestamp or datetime.now(), start))
+        waited = time.monotonic() - start
+        with self._lock:
+            self._stats['enqueued'] += 1
+            self._stats['put_wait_seconds'] += waited
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._queue.qsize())
+
+    def metrics(self):
+        """Backpressure metrics: queue depth, time fetchers spent blocked and write lag.
+
+        Write lag is how long a snapshot waited between being queued and
+        being stored.
+        """
+        with self._lock:
+            metrics = dict(self._stats)
+        metrics['queue_depth'] = self._queue.qsize()
+        metrics['queue_capacity'] = self._queue.maxsize
+        return metrics
+
+    def close(self):
+        """Write everything still queued and stop the writer thread."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _next_batch(self):
+        # Wait for the first snapshot, then collect whatever else arrives
+        # before the flush deadline
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _save(self, snapshots, retries=None):
+        # Retry with a doubling backoff; raises the last error if every attempt fails
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                with instrumentation.stage('recorder.write'):
+                    self.storage.save_many(snapshots)
+                return
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                print(f"Error saving {len(snapshots)} snapshots: {e}; retrying")
+                with self._lock:
+                    self._stats['write_retries'] += 1
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def _save_each(self, snapshots):
+        # Save snapshots one at a time, once each; returns the ones that failed
+        failed = []
+        for snapshot in snapshots:
+            try:
+                self._save([snapshot], retries=0)
+            except Exception as e:
+                print(f"Error saving the {snapshot[0]} snapshot of {snapshot[2]}: {e}")
+                failed.append(snapshot)
+        return failed
+
+    def _spill(self, snapshots):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f"spill-{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.pickle")
+        self._dump(snapshots, path)
+        return path
+
+    def _dump(self, snapshots, path):
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(snapshots, f)
+        os.replace(path + '.tmp', path)
+
+    def _write_spilled(self):
+        # Snapshots spilled by an earlier writer are saved before new ones.
+        # Each file gets one attempt, then one per snapshot; the snapshots
+        # that still fail stay in the file and the next file is tried.
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return
+        for name in sorted(os.listdir(self.spill_dir)):
+            if not name.endswith('.pickle'):
+                continue
+            path = os.path.join(self.spill_dir, name)
+            with open(path, 'rb') as f:
+                snapshots = pickle.load(f)
+            try:
+                self._save(snapshots, retries=0)
+                failed = []
+            except Exception as e:
+                print(f"Error saving spilled snapshots from {path}: {e}")
+                failed = self._save_each(snapshots) if len(snapshots) > 1 else snapshots
+            if failed:
+                if len(failed) < len(snapshots):
+                    self._dump(failed, path)
+                print(f"Data saved for {len(snapshots) - len(failed)} of {len(snapshots)} spilled snapshots "
+                      f"from {path}; keeping the rest")
+            else:
+                os.remove(path)
+                print(f"Data saved for {len(snapshots)} spilled snapshots from {path}")
+
+    def _run(self):
+        self._write_spilled()
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if not batch:
+                continue
+
+            start = time.monotonic()
+            snapshots = [(symbol, data, timestamp) for symbol, data, timestamp, _ in batch]
+            failed = spilled = 0
+            try:
+                self._save(snapshots)
+                rejected = []
+            except Exception as e:
+                print(f"Error saving {len(batch)} snapshots: {e}")
+                rejected = self._save_each(snapshots) if len(snapshots) > 1 else snapshots
+            if not rejected:
+                print(f"Data saved for {len(batch)} snapshots at {datetime.now():%Y-%m-%d_%H-%M-%S}")
+            elif self.spill_dir:
+                try:
+                    path = self._spill(rejected)
+                    spilled = len(rejected)
+                    print(f"Saved {len(batch) - spilled} of {len(batch)} snapshots; spilled the rest to {path}")
+                except Exception as spill_error:
+                    failed = len(rejected)
+                    print(f"Saved {len(batch) - failed} of {len(batch)} snapshots; spilling the rest failed: "
+                          f"{spill_error}")
+            else:
+                failed = len(rejected)
+                print(f"Saved {len(batch) - failed} of {len(batch)} snapshots")
+            end = time.monotonic()
+            written = len(batch) - failed - spilled
+            instrumentation.count('recorder.snapshots_written', written)
+
+            lag = end - min(queued for _, _, _, queued in batch)
+            with self._lock:
+                self._stats['batches'] += 1
+                self._stats['written'] += written
+                self._stats['failed'] += failed
+                self._stats['spilled'] += spilled
+                self._stats['write_seconds'] += end - start
+                self._stats['last_batch_size'] = len(batch)
+                self._stats['last_write_seconds'] = end - start
+                self._stats['last_write_lag_seconds'] = lag
+                self._stats['max_write_lag_seconds'] = max(self._stats['max_write_lag_seconds'], lag)
@@ -0,0 +1,160 @@
+import argparse
+import heapq
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from options_storage import CONTRACT_COLUMN, REMOVED_COLUMN, SNAPSHOT_TYPE_COLUMN, TIME_COLUMN
+
+# Replays recorded options snapshots in timestamp order. Each symbol's files
+# are read lazily in record batches and the per-symbol streams are merged
+# with a heap, so memory depends on the number of symbols and the batch size,
+# not on how many months of pulls are replayed. Works on ParquetStorage and
+# DeltaStorage directories; delta records are applied to a running chain so
+# the callback always sees full chains.
+
+BATCH_SIZE = 8192  # rows read at a time per symbol
+
+
+def list_symbols(output_dir):
+    """Underlyings with data in a ParquetStorage directory."""
+    return sorted(name.split('=', 1)[1] for name in os.listdir(output_dir) if name.startswith('underlying='))
+
+
+def _first_snapshot_time(path):
+    # Smallest snapshot_time from the Parquet footer statistics, without reading any data
+    metadata = pq.ParquetFile(path).metadata
+    column = metadata.schema.to_arrow_schema().get_field_index(TIME_COLUMN)
+    times = []
+    for i in range(metadata.num_row_groups):
+        statistics = metadata.row_group(i).column(column).statistics
+        if statistics is None or not statistics.has_min_max:
+            return pd.Timestamp(pq.read_table(path, columns=[TIME_COLUMN])[TIME_COLUMN].to_pandas().min())
+        times.append(pd.Timestamp(statistics.min))
+    return min(times) if times else pd.Timestamp.max
+
+
+def _symbol_files(output_dir, symbol, start=None, end=None):
+    # Date partitions sort in time order. Files within one are ordered by
+    # their first snapshot_time: part-HHMMSS-<uuid> names of two pulls in the
+    # same second would otherwise sort by the random uuid.
+    root = os.path.join(output_dir, f"underlying={symbol}")
+    if not os.path.isdir(root):
+        raise ValueError(f"No recorded data for {symbol!r} in {output_dir}")
+    first = pd.Timestamp(start).strftime('%Y-%m-%d') if start is not None else None
+    last = pd.Timestamp(end).strftime('%Y-%m-%d') if end is not None else None
+    for partition in sorted(os.listdir(root)):
+        date = partition.split('=', 1)[1]
+        if (first and date < first) or (last and date > last):
+            continue
+        directory = os.path.join(root, partition)
+        paths = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                 if name.endswith('.parquet') and not name.startswith('.')]
+        yield from sorted(paths, key=_first_snapshot_time)
+
+
+def _file_snapshots(path, batch_size):
+    # Split record batches into runs of equal snapshot_time; a run cut off at
+    # the end of a batch is carried into the next one
+    pending = None
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        frame = batch.to_pandas()
+        if pending is not None:
+            frame = pd.concat([pending, frame], ignore_index=True)
+        times = frame[TIME_COLUMN].to_numpy()
+        starts = np.concatenate(([0], np.flatnonzero(times[1:] != times[:-1]) + 1))
+        for begin, stop in zip(starts[:-1], starts[1:]):
+            yield frame.iloc[begin:stop]
+        pending = frame.iloc[starts[-1]:]
+    if pending is not None and len(pending):
+        yield pending
+
+
+def iter_symbol_snapshots(output_dir, symbol, start=None, end=None, batch_size=BATCH_SIZE):
+    """Yield (timestamp, symbol, chain) for one symbol in time order, reading lazily.
+
+    Delta-encoded records are applied to the previous chain, so every chain
+    is complete. start and end bound the timestamps (inclusive).
+    """
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    state = None
+    for path in _symbol_files(output_dir, symbol, start, end):
+        for rows in _file_snapshots(path, batch_size):
+            timestamp = rows[TIME_COLUMN].iloc[0]
+            if end is not None and timestamp > end:
+                return
+
+            if SNAPSHOT_TYPE_COLUMN in rows.columns:
+                keyframe = rows[SNAPSHOT_TYPE_COLUMN].iloc[0] == 'keyframe'
+                # Unchanged pulls are stored as a single row with a null contract
+                rows = rows[rows[CONTRACT_COLUMN].notna()].set_index(CONTRACT_COLUMN)
+                if state is None or keyframe:
+                    state = rows
+                else:
+                    removed = rows.index[rows[REMOVED_COLUMN].astype(bool)]
+                    state = pd.concat([state.drop(rows.index, errors='ignore'),
+                                       rows.drop(removed, errors='ignore')])
+                # Deltas before `start` still have to be applied to the state
+                if start is not None and timestamp < start:
+                    continue
+                chain = state.drop(columns=[SNAPSHOT_TYPE_COLUMN, REMOVED_COLUMN]).reset_index()
+            else:
+                if start is not None and timestamp < start:
+                    continue
+                chain = rows.reset_index(drop=True)
+            yield timestamp, symbol, chain
+
+
+def iter_snapshots(output_dir, symbols=None, start=None, end=None, batch_size=BATCH_SIZE):
+    """Yield (timestamp, symbol, chain) across symbols in timestamp order (heap k-way merge)."""
+    symbols = list_symbols(output_dir) if symbols is None else symbols
+    # Checked up front so an unknown symbol fails here, not part way through the merge
+    unknown = [symbol for symbol in symbols if not os.path.isdir(os.path.join(output_dir, f"underlying={symbol}"))]
+    if unknown:
+        raise ValueError(f"No recorded data for {unknown} in {output_dir}")
+    streams = [iter_symbol_snapshots(output_dir, symbol, start, end, batch_size) for symbol in symbols]
+    return heapq.merge(*streams, key=lambda snapshot: snapshot[0])
+
+
+def replay(output_dir, on_snapshot, symbols=None, start=None, end=None, batch_size=BATCH_SIZE):
+    """Feed every stored snapshot to on_snapshot(timestamp, symbol, chain) in time order.
+
+    Returns replay statistics, including throughput in snapshots per second.
+    """
+    snapshots = 0
+    rows = 0
+    began = time.perf_counter()
+    for timestamp, symbol, chain in iter_snapshots(output_dir, symbols, start, end, batch_size):
+        on_snapshot(timestamp, symbol, chain)
+        snapshots += 1
+        rows += len(chain)
+    seconds = time.perf_counter() - began
+    return {
+        'snapshots': snapshots,
+        'rows': rows,
+        'seconds': seconds,
+        'snapshots_per_second': snapshots / seconds if seconds > 0 else float('nan'),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded options snapshots and report throughput")
+    parser.add_argument('output_dir', help="ParquetStorage or DeltaStorage directory")
+    parser.add_argument('--symbols', help="comma-separated underlyings; default all")
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    symbols = args.symbols.split(',') if args.symbols else None
+    try:
+        stats = replay(args.output_dir, lambda timestamp, symbol, chain: None, symbols=symbols, start=args.start,
+                       end=args.end, batch_size=args.batch_size)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Replayed {stats['snapshots']} snapshots ({stats['rows']} rows) in {stats['seconds']:.2f}s: "
+          f"{stats['snapshots_per_second']:.0f} snapshots/s")
@@ -0,0 +1,326 @@
+import os
+import uuid
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Storage backends for options chain snapshots. Every backend takes the raw
+# chain returned by OptionsChainFetcher.fetch and stores its 'options' records.
+
+# Chain fields that repeat across contracts and across pulls. The Parquet
+# backend dictionary-encodes them and the reader filters on them.
+STRIKE_COLUMN = 'strikePrice'
+EXPIRY_COLUMN = 'expirationDate'
+PUT_CALL_COLUMN = 'putCall'
+DICTIONARY_COLUMNS = [STRIKE_COLUMN, EXPIRY_COLUMN, PUT_CALL_COLUMN]
+
+# Pull time added to every Parquet record
+TIME_COLUMN = 'snapshot_time'
+
+# Contract identifier within a chain, and the record kind columns added by DeltaStorage
+CONTRACT_COLUMN = 'symbol'
+SNAPSHOT_TYPE_COLUMN = 'snapshot_type'
+REMOVED_COLUMN = 'removed'
+KEYFRAME_INTERVAL = 12  # pulls, one hour at 5-minute intervals
+
+# Types of the columns the storage adds, filters or dictionary-encodes. Every
+# other numeric field is stored as float64, so a field that is whole in one
+# pull (a strike of 100) and fractional in another (102.5) has one type
+# across files.
+OPTIONS_SCHEMA = pa.schema([
+    (TIME_COLUMN, pa.timestamp('us')),
+    (CONTRACT_COLUMN, pa.string()),
+    (PUT_CALL_COLUMN, pa.string()),
+    (STRIKE_COLUMN, pa.float64()),
+    (EXPIRY_COLUMN, pa.string()),
+    (SNAPSHOT_TYPE_COLUMN, pa.string()),
+    (REMOVED_COLUMN, pa.bool_()),
+])
+
+# Partition keys. The underlying is not called 'symbol' because chain records
+# already carry the contract symbol under that name.
+PARTITIONING = ds.partitioning(pa.schema([('underlying', pa.string()), ('date', pa.string())]), flavor='hive')
+
+
+class HDF5Storage:
+    """Appends each chain to a PyTables table in <output_dir>/<symbol>_options_data.h5.
+
+    This is the original recorder format; records are stored as returned by
+    the API, without a pull time column, so existing files keep appending.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+    def path(self, symbol):
+        return os.path.join(self.output_dir, f"{symbol}_options_data.h5")
+
+    def save(self, symbol, options_chain_data, timestamp=None):
+        df = pd.DataFrame(options_chain_data['options'])
+        df.to_hdf(self.path(symbol), key=symbol, mode='a', append=True, format='table', data_columns=True)
+
+    def save_many(self, snapshots):
+        for symbol, options_chain_data, timestamp in snapshots:
+            self.save(symbol, options_chain_data, timestamp)
+
+
+class ParquetStorage:
+    """Writes chains as Parquet files partitioned by symbol and date.
+
+    Files go to <output_dir>/underlying=<symbol>/date=<YYYY-MM-DD>/, one per
+    symbol and date per save call. The first write of a symbol on a new
+    date compacts its earlier dates into one file each, so a finished day
+    is a single file rather than one per flush. Strikes, expiries and
+    put/call are dictionary encoded; read them back with read_options.
+    """
+
+    def __init__(self, output_dir, compression='zstd'):
+        self.output_dir = output_dir
+        self.compression = compression
+        self._partitions = set()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def save(self, symbol, options_chain_data, timestamp=None):
+        self.save_many([(symbol, options_chain_data, timestamp)])
+
+    def save_many(self, snapshots):
+        partitions = {}
+        for symbol, options_chain_data, timestamp in snapshots:
+            timestamp = timestamp or datetime.now()
+            frame = pd.DataFrame(options_chain_data['options'])
+            frame.insert(0, TIME_COLUMN, pd.Timestamp(timestamp))
+            partitions.setdefault((symbol, timestamp.strftime('%Y-%m-%d')), []).append(frame)
+
+        # Every partition is converted before any is written, so a chain
+        # that cannot be stored fails the call without writing part of it
+        tables = {}
+        for (symbol, date), frames in partitions.items():
+            frame = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            tables[symbol, date] = _stored_table(pa.Table.from_pandas(frame, preserve_index=False))
+        for (symbol, date), table in tables.items():
+            self._write(symbol, date, table)
+
+    def compact(self, symbol, date):
+        """Merge the files of one symbol and date into a single file in pull time order."""
+        directory = self._directory(symbol, date)
+        paths = _part_files(directory)
+        if len(paths) < 2:
+            return
+        table = pa.concat_tables([pq.ParquetFile(path).read() for path in paths], promote_options='permissive')
+        table = _stored_table(table).sort_by(TIME_COLUMN)
+        # The merged file is in place before the parts are removed, so a
+        # reader listing the directory meanwhile may see rows twice but
+        # never misses any
+        self._write_file(directory, table)
+        for path in paths:
+            os.remove(path)
+
+    def _directory(self, symbol, date):
+        return os.path.join(self.output_dir, f"underlying={symbol}", f"date={date}")
+
+    def _write(self, symbol, date, table):
+        directory = self._directory(symbol, date)
+        if directory not in self._partitions:
+            os.makedirs(directory, exist_ok=True)
+            self._partitions.add(directory)
+            # Earlier dates of the symbol are complete by now
+            root = os.path.dirname(directory)
+            for partition in sorted(os.listdir(root)):
+                if partition.startswith('date=') and partition < f"date={date}":
+                    self.compact(symbol, partition.split('=', 1)[1])
+        self._write_file(directory, table)
+
+    def _write_file(self, directory, table):
+        first = table[TIME_COLUMN][0].as_py()
+        name = f"part-{first:%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+        # Written under a dot-prefixed name, which dataset discovery skips,
+        # and renamed once complete so readers never see a partial file
+        temp_path = os.path.join(directory, '.' + name)
+        pq.write_table(table, temp_path, compression=self.compression,
+                       use_dictionary=[c for c in DICTIONARY_COLUMNS if c in table.column_names])
+        os.replace(temp_path, os.path.join(directory, name))
+
+
+def _part_files(directory):
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.endswith('.parquet') and not name.startswith('.')]
+
+
+def _stored_field(field):
+    # The OPTIONS_SCHEMA type of a column, float64 for other numbers
+    if field.name in OPTIONS_SCHEMA.names:
+        return OPTIONS_SCHEMA.field(field.name)
+    if pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+        return field.with_type(pa.float64())
+    return field
+
+
+def _stored_table(table):
+    return table.cast(pa.schema([_stored_field(field) for field in table.schema]))
+
+
+class DeltaStorage:
+    """Stores only the contracts that changed since a symbol's previous pull.
+
+    A full keyframe is written on a symbol's first pull, on its first pull of
+    each date and every `keyframe_interval` pulls; other pulls store the
+    contracts whose fields changed, were added, or (as rows flagged in the
+    'removed' column) disappeared; a pull with no changes stores a single
+    marker row with a null contract. Rebuild a chain with read_chain_as_of.
+    The last pull of every symbol is kept in memory to diff against.
+    """
+
+    def __init__(self, storage, keyframe_interval=KEYFRAME_INTERVAL, ignore_columns=()):
+        self.storage = storage
+        self.keyframe_interval = keyframe_interval
+        self.ignore_columns = set(ignore_columns)
+        self._last = {}
+
+    def save(self, symbol, options_chain_data, timestamp=None):
+        self.save_many([(symbol, options_chain_data, timestamp)])
+
+    def save_many(self, snapshots):
+        # The last pulls only advance once the batch is stored, so a failed
+        # save can be retried and is diffed against the same chains
+        encoded = []
+        last = {}
+        for symbol, options_chain_data, timestamp in snapshots:
+            timestamp = timestamp or datetime.now()
+            previous = last.get(symbol, self._last.get(symbol))
+            records, last[symbol] = self._encode(previous, pd.DataFrame(options_chain_data['options']), timestamp)
+            encoded.append((symbol, {'options': records}, timestamp))
+        if encoded:
+            self.storage.save_many(encoded)
+        self._last.update(last)
+
+    def _encode(self, last, chain, timestamp):
+        # Returns the records to store and the symbol's new last pull
+        chain = chain.drop_duplicates(CONTRACT_COLUMN, keep='last').set_index(CONTRACT_COLUMN)
+        if last is None or last['date'] != timestamp.date() or last['pulls'] >= self.keyframe_interval:
+            keyframe = chain.reset_index()
+            keyframe[SNAPSHOT_TYPE_COLUMN] = 'keyframe'
+            keyframe[REMOVED_COLUMN] = False
+            return keyframe.to_dict('records'), {'chain': chain, 'date': timestamp.date(), 'pulls': 1}
+
+        previous = last['chain']
+        last = {'chain': chain, 'date': last['date'], 'pulls': last['pulls'] + 1}
+
+        columns = [c for c in chain.columns.union(previous.columns) if c not in self.ignore_columns]
+        current = chain.reindex(columns=columns)
+        before = previous.reindex(index=chain.index, columns=columns)
+        same = (current == before) | (current.isna() & before.isna())
+        changed = chain[~same.all(axis=1)].reset_index()
+        changed[SNAPSHOT_TYPE_COLUMN] = 'delta'
+        changed[REMOVED_COLUMN] = False
+
+        removed = pd.DataFrame({CONTRACT_COLUMN: previous.index.difference(chain.index)})
+        removed[SNAPSHOT_TYPE_COLUMN] = 'delta'
+        removed[REMOVED_COLUMN] = True
+
+        delta = pd.concat([changed, removed], ignore_index=True) if len(removed) else changed
+        if delta.empty:
+            # A pull with no changes still gets a row, so readers can tell it
+            # from a pull that never happened; its null contract is skipped
+            # when chains are rebuilt
+            return [{CONTRACT_COLUMN: None, SNAPSHOT_TYPE_COLUMN: 'delta', REMOVED_COLUMN: False}], last
+        return delta.to_dict('records'), last
+
+
+def read_chain_as_of(output_dir, symbol, timestamp):
+    """Rebuild a symbol's full chain as of `timestamp` from a DeltaStorage directory.
+
+    Each contract's row is its latest stored version; its snapshot_time is
+    when that version was pulled.
+    """
+    timestamp = pd.Timestamp(timestamp)
+    # Every date starts with a keyframe, so the chain only depends on that date's files
+    rows = read_options(output_dir, symbols=[symbol], start=timestamp.normalize(), end=timestamp)
+    keyframes = rows.loc[rows[SNAPSHOT_TYPE_COLUMN] == 'keyframe', TIME_COLUMN]
+    if keyframes.empty:
+        raise ValueError(f"No keyframe for {symbol} on {timestamp:%Y-%m-%d} before {timestamp}")
+
+    rows = rows[(rows[TIME_COLUMN] >= keyframes.max()) & rows[CONTRACT_COLUMN].notna()]
+    rows = rows.sort_values(TIME_COLUMN, kind='stable').drop_duplicates(CONTRACT_COLUMN, keep='last')
+    rows = rows[~rows[REMOVED_COLUMN].astype(bool)]
+    return rows.drop(columns=[SNAPSHOT_TYPE_COLUMN, REMOVED_COLUMN, 'date']).reset_index(drop=True)
+
+
+STORAGE_BACKENDS = {
+    'hdf5': HDF5Storage,
+    'parquet': ParquetStorage,
+    'parquet-delta': lambda output_dir: DeltaStorage(ParquetStorage(output_dir)),
+}
+
+
+def create_storage(backend, output_dir):
+    """Create the storage backend registered under `backend`."""
+    try:
+        return STORAGE_BACKENDS[backend](output_dir)
+    except KeyError:
+        raise ValueError(f"Unknown storage backend {backend!r}, expected one of {sorted(STORAGE_BACKENDS)}")
+
+
+def options_dataset(output_dir, filter=None):
+    """Open a ParquetStorage directory as a pyarrow dataset.
+
+    The schema is unified over the files of every partition `filter` can
+    match, with the stored column types, so files written with different
+    numeric types (or before they were fixed) still read as one table.
+    """
+    dataset = ds.dataset(output_dir, format='parquet', partitioning=PARTITIONING)
+    schemas = [fragment.physical_schema for fragment in dataset.get_fragments(filter=filter)]
+    if not schemas:
+        return dataset
+    schema = pa.unify_schemas(schemas, promote_options='permissive')
+    schema = pa.schema([_stored_field(field) for field in schema] + list(PARTITIONING.schema))
+    return ds.dataset(output_dir, schema=schema, format='parquet', partitioning=PARTITIONING)
+
+
+def options_filter(symbols=None, start=None, end=None, expiries=None, min_strike=None, max_strike=None,
+                   put_call=None):
+    """Dataset filter expression for read_options; None when nothing is filtered.
+
+    start and end bound the pull time (inclusive) and also prune date
+    partitions; expiries and put_call are lists of accepted values.
+    """
+    conditions = []
+    if symbols is not None:
+        conditions.append(ds.field('underlying').isin(list(symbols)))
+    if start is not None:
+        start = pd.Timestamp(start)
+        conditions.append(ds.field('date') >= start.strftime('%Y-%m-%d'))
+        conditions.append(ds.field(TIME_COLUMN) >= start.to_pydatetime())
+    if end is not None:
+        end = pd.Timestamp(end)
+        conditions.append(ds.field('date') <= end.strftime('%Y-%m-%d'))
+        conditions.append(ds.field(TIME_COLUMN) <= end.to_pydatetime())
+    if expiries is not None:
+        conditions.append(ds.field(EXPIRY_COLUMN).isin(list(expiries)))
+    if min_strike is not None:
+        conditions.append(ds.field(STRIKE_COLUMN) >= min_strike)
+    if max_strike is not None:
+        conditions.append(ds.field(STRIKE_COLUMN) <= max_strike)
+    if put_call is not None:
+        conditions.append(ds.field(PUT_CALL_COLUMN).isin(list(put_call)))
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def read_options(output_dir, symbols=None, start=None, end=None, expiries=None, min_strike=None,
+                 max_strike=None, put_call=None, columns=None):
+    """Read stored chains from a ParquetStorage directory as a DataFrame.
+
+    Filters are pushed down to the Parquet scan, so only matching partitions
+    and row groups are read.
+    """
+    expression = options_filter(symbols, start, end, expiries, min_strike, max_strike, put_call)
+    dataset = options_dataset(output_dir, expression)
+    table = dataset.to_table(columns=columns, filter=expression)
+    return table.to_pandas()
@@ -0,0 +1,249 @@
+import argparse
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import channel_engine
+import logregress_channel_backtest_claude as logregress
+from market_data import load_columns
+from metrics import summarize
+import instrumentation
+
+# Parameter sweeps over the channel strategies. Prices are loaded once into a
+# shared memory block that every worker process maps instead of receiving a
+# pickled copy per run. Runs are ranked on the metrics of their equity curve,
+# with open positions priced at each bar's close.
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+
+# Defaults mirror run_backtest in exp_regression_channel_backtest.py and the
+# module constants of logregress_channel_backtest_claude.py
+EXP_DEFAULTS = {
+    'spread': 0.0002,
+    'start_value': 100000,
+    'warmup': channel_engine.WARMUP_BARS,
+    'band_mult': 0.5,
+    'window': None,
+    'periods_per_year': 252,
+}
+LOG_DEFAULTS = {
+    'spread': logregress.SPREAD,
+    'start_value': logregress.INITIAL_ACCOUNT_VALUE,
+    'margin': logregress.MARGIN_PERCENTAGE,
+    'allocation': logregress.STRATEGY_ALLOCATION,
+    'kelly_fraction': logregress.KELLY_FRACTION,
+    'warmup': channel_engine.WARMUP_BARS,
+    'band_mult': 0.5,
+    'window': None,
+    'periods_per_year': 252,
+}
+
+RANK_COLUMNS = ['sharpe', 'sortino', 'max_drawdown', 'cagr', 'final_equity', 'trades']
+
+
+def load_prices(file_path):
+    """Load the OHLC columns of a CSV as a (4, n) float64 array in date order."""
+    columns = load_columns(file_path, PRICE_COLUMNS)
+    return np.vstack([columns[column] for column in PRICE_COLUMNS])
+
+
+def run_exp_channel(prices, spread, start_value, warmup, band_mult, window, periods_per_year):
+    """Run the exp_regression_channel_backtest strategy on a (4, n) price array."""
+    open_, high, low, close = prices
+    with instrumentation.stage('exp.channel'):
+        predicted, stdev = channel_engine.exp_channel_bands(close, window=window, warmup=warmup)
+    with instrumentation.stage('exp.signals'):
+        buy, sell = channel_engine.exp_channel_signals(open_, close, predicted, stdev, band_mult=band_mult)
+    with instrumentation.stage('exp.execution'):
+        trades, _, equity = channel_engine.exp_channel_kernel(open_, close, buy, sell, spread=spread,
+                                                              start_value=start_value, warmup=warmup)
+    with instrumentation.stage('exp.metrics'):
+        return summarize(equity, len(trades), periods_per_year=periods_per_year,
+                         trade_pnl=channel_engine.exp_trade_pnl(trades, spread),
+                         positions=channel_engine.position_mask(trades, len(close), warmup))
+
+
+def run_log_channel(prices, spread, start_value, margin, allocation, kelly_fraction, warmup, band_mult, window,
+                    periods_per_year):
+    """Run the logregress_channel_backtest_claude strategy on a (4, n) price array."""
+    open_, high, low, close = prices
+    with instrumentation.stage('log.channel'):
+        center, upper, lower = channel_engine.log_channel_bands(close, window=window, warmup=warmup)
+    with instrumentation.stage('log.signals'):
+        buy, buy_price, sell, sell_price = channel_engine.log_channel_signals(open_, high, close, center, upper,
+                                                                              lower, band_mult=band_mult)
+    kelly = partial(logregress.half_kelly_criterion, fraction=kelly_fraction)
+    with instrumentation.stage('log.execution'):
+        trades, _, equity, allocations, profits, losses = channel_engine.log_channel_kernel(
+            buy, buy_price, sell, sell_price, close, kelly, start_value=start_value, allocation=allocation,
+            margin=margin, spread=spread, warmup=warmup)
+    with instrumentation.stage('log.metrics'):
+        return summarize(equity, len(trades), periods_per_year=periods_per_year, trade_pnl=profits + losses,
+                         positions=channel_engine.position_mask(trades, len(close), warmup))
+
+
+STRATEGIES = {
+    'exp': (run_exp_channel, EXP_DEFAULTS),
+    'log': (run_log_channel, LOG_DEFAULTS),
+}
+
+
+def parameter_grid(space):
+    """Every combination of a {name: [values]} space, as dicts."""
+    names = list(space)
+    for values in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def random_parameters(space, samples, seed=None):
+    """Random draws from a space whose values are lists (choices) or (low, high) tuples."""
+    rng = random.Random(seed)
+    for _ in range(samples):
+        params = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    params[name] = rng.randint(low, high)
+                else:
+                    params[name] = rng.uniform(low, high)
+            else:
+                params[name] = rng.choice(values)
+        yield params
+
+
+# Worker-side view of the shared price block, set once per process
+_shared_block = None
+_shared_prices = None
+
+
+def _attach_prices(name, shape):
+    global _shared_block, _shared_prices
+    _shared_block = shared_memory.SharedMemory(name=name)
+    _shared_prices = np.ndarray(shape, dtype=np.float64, buffer=_shared_block.buf)
+
+
+def _run_in_worker(strategy, params):
+    run, defaults = STRATEGIES[strategy]
+    result = run(_shared_prices, **{**defaults, **params})
+    if instrumentation.enabled():
+        # Ship this run's stage timings back for the parent's report
+        return {**params, **result, instrumentation.STAGES_KEY: instrumentation.collect()}
+    return {**params, **result}
+
+
+def sweep(prices, strategy, param_sets, workers=None):
+    """Run every parameter set across a process pool.
+
+    Yields one dict of parameters and metrics per run as runs complete.
+    Parameters missing from a set take the strategy defaults.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}, expected one of {sorted(STRATEGIES)}")
+    prices = np.ascontiguousarray(prices, dtype=np.float64)
+    block = shared_memory.SharedMemory(create=True, size=max(prices.nbytes, 1))
+    try:
+        np.ndarray(prices.shape, dtype=np.float64, buffer=block.buf)[:] = prices
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_prices,
+                                 initargs=(block.name, prices.shape)) as executor:
+            futures = [executor.submit(_run_in_worker, strategy, params) for params in param_sets]
+            for future in as_completed(futures):
+                result = future.result()
+                if instrumentation.STAGES_KEY in result:
+                    instrumentation.merge(result.pop(instrumentation.STAGES_KEY))
+                yield result
+    finally:
+        block.close()
+        block.unlink()
+
+
+def rank_results(results, by='sharpe'):
+    """Collect sweep results into a table ranked best first."""
+    table = pd.DataFrame(list(results))
+    if table.empty:
+        return table
+    table = table.sort_values(by, ascending=False, na_position='last').reset_index(drop=True)
+    table.insert(0, 'rank', np.arange(1, len(table) + 1))
+    return table
+
+
+def _parse_value(text):
+    if text.lower() == 'none':
+        return None
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    raise ValueError(f"Not a number: {text}")
+
+
+def _parse_space(specs):
+    # name=v1,v2,... is a list of choices; name=low:high is a range for random sampling
+    space = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        if not values:
+            raise ValueError(f"Expected name=values, got {spec!r}")
+        if ':' in values:
+            low, high = values.split(':', 1)
+            space[name] = (_parse_value(low), _parse_value(high))
+        else:
+            space[name] = [_parse_value(v) for v in values.split(',')]
+    return space
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grid or random parameter sweep of the channel strategies")
+    parser.add_argument('input_csv')
+    parser.add_argument('params', nargs='*',
+                        help="name=v1,v2 for a list of values or name=low:high for a random range; "
+                             "window=none,250 sweeps expanding vs rolling fits")
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='log')
+    parser.add_argument('--samples', type=int, help="random sample this many runs instead of the full grid")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--rank-by', choices=RANK_COLUMNS, default='sharpe')
+    parser.add_argument('--output', default='sweep_results.csv')
+    parser.add_argument('--profile', action='store_true', help="print a per-stage timing breakdown at exit")
+    parser.add_argument('--profile-trace', help="also write the stage timings as Chrome trace JSON")
+    args = parser.parse_intermixed_args(argv)
+
+    if args.profile or args.profile_trace:
+        instrumentation.configure(trace_path=args.profile_trace)
+
+    try:
+        space = _parse_space(args.params)
+    except ValueError as e:
+        parser.error(str(e))
+    unknown = set(space) - set(STRATEGIES[args.strategy][1])
+    if unknown:
+        parser.error(f"Unknown parameters for {args.strategy}: {sorted(unknown)}")
+    if args.samples:
+        param_sets = list(random_parameters(space, args.samples, seed=args.seed))
+    elif any(isinstance(values, tuple) for values in space.values()):
+        parser.error("Ranges (low:high) need --samples")
+    else:
+        param_sets = list(parameter_grid(space))
+
+    prices = load_prices(args.input_csv)
+    results = []
+    for result in sweep(prices, args.strategy, param_sets, workers=args.workers):
+        results.append(result)
+        print(f"[{len(results)}/{len(param_sets)}] {args.rank_by}={result[args.rank_by]:.4f} "
+              + ' '.join(f"{name}={result[name]}" for name in space))
+
+    table = rank_results(results, by=args.rank_by)
+    table.to_csv(args.output, index=False)
+    print(f"Ranked results written to {args.output}")
+    print(table.head(10).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
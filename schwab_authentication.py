@@ -1,5 +1,4 @@
 import os
-import pickle
 import time
 from requests_oauthlib import OAuth2Session
 from selenium import webdriver
@@ -7,6 +6,7 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
+from token_store import TokenStore, TOKEN_FILE
 
 # Schwab OAuth 2.0 setup (replace with your actual details)
 SCHWAB_AUTH_URL = 'https://www.schwab.com/oauth2/authorize'  # Placeholder, adjust according to Schwab API docs
@@ -16,11 +16,8 @@ CLIENT_SECRET = os.getenv('SCHWAB_CLIENT_SECRET')
 REDIRECT_URI = 'http://localhost:8000/callback'               # Placeholder, change this according to your app
 SCOPE = ['some_scope']                                        # Placeholder for required scopes
 
-# Directory for saving OAuth pickle file
-PICKLE_FILE = 'schwab_oauth.pickle'
-
-# Function to perform OAuth 2.0 authentication
-def authenticate():
+# Function to perform the interactive OAuth 2.0 browser login and return the token
+def browser_login():
     # Start the selenium webdriver (Chrome)
     chrome_options = Options()
     chrome_options.add_argument("--headless")  # Optional: Remove this line if you want to see the browser window for debugging
@@ -48,12 +45,16 @@ def authenticate():
     token = oauth_session.fetch_token(SCHWAB_TOKEN_URL,
                                       authorization_response=authorization_response,
                                       client_secret=CLIENT_SECRET)
+    return dict(token)
 
-    # Save the session into a pickle file
-    with open(PICKLE_FILE, 'wb') as f:
-        pickle.dump(oauth_session, f)
+# Function to perform OAuth 2.0 authentication and save the token for the recorder
+def authenticate():
+    token = browser_login()
+    store = TokenStore(TOKEN_FILE)
+    with store.locked():
+        store.save(token)
     
-    print(f"Authentication successful. OAuth session saved in {PICKLE_FILE}")
+    print(f"Authentication successful. Token saved in {TOKEN_FILE}")
 
 if __name__ == "__main__":
     authenticate()
\ No newline at end of file
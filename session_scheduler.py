@@ -0,0 +1,161 @@
+import math
+import threading
+from datetime import datetime, timedelta
+
+import instrumentation
+from market_calendar import MarketCalendar, UTC
+
+# Runs the options recorder's pulls during market sessions only. Each symbol
+# has its own interval, and pulls land on wall-clock boundaries (every 5
+# minutes means 9:30, 9:35, ... local time), so liquid names can be sampled
+# more often than the rest. Between sessions the scheduler sleeps until the
+# next open instead of waking up to check the clock.
+#
+# Pulls run on a separate worker thread, so a slow pull never shifts the
+# schedule. When a run is still going at the next boundary, the symbols due
+# are either folded into one catch-up run after it (overrun='coalesce') or
+# dropped (overrun='skip').
+
+DEFAULT_INTERVAL = 300  # seconds
+MAX_SLEEP = 300  # re-read the clock at least this often, in case it jumps or the machine sleeps
+OVERRUN_POLICIES = ('coalesce', 'skip')
+
+
+def request_rate(intervals):
+    """Pulls per minute the intervals ({symbol: seconds}) add up to."""
+    return sum(60 / interval for interval in intervals.values())
+
+
+class CollectionScheduler:
+    """Calls job(symbols) with the symbols due at each boundary of every market session.
+
+    intervals maps each symbol to its pull interval in whole seconds. Pulls
+    happen at the session open, at every interval boundary counted from
+    local midnight, and at the close.
+    """
+
+    def __init__(self, job, intervals, calendar=None, overrun='coalesce', requests_per_minute=None,
+                 clock=None):
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError(f"overrun must be one of {OVERRUN_POLICIES}, not {overrun!r}")
+        if any(int(interval) != interval or interval <= 0 for interval in intervals.values()):
+            raise ValueError("intervals must be positive whole seconds")
+        self.job = job
+        self.intervals = {symbol: int(interval) for symbol, interval in intervals.items()}
+        self.calendar = calendar or MarketCalendar()
+        self.overrun = overrun
+        self.clock = clock or (lambda: datetime.now(UTC))
+        self._tick = math.gcd(*self.intervals.values()) if self.intervals else DEFAULT_INTERVAL
+        self._stop = threading.Event()
+        self._work = threading.Condition()
+        self._pending = set()
+        self._busy = False
+        self._threads = []
+        self.runs = 0
+        self.skipped = 0
+        self.coalesced = 0
+
+        rate = request_rate(self.intervals)
+        if requests_per_minute is not None and rate > requests_per_minute:
+            print(f"Warning: the symbol intervals need {rate:.1f} requests per minute, "
+                  f"above the budget of {requests_per_minute}; pulls will queue behind the rate limiter")
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._schedule, daemon=True),
+                         threading.Thread(target=self._work_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        """Stop scheduling and wait for a run in progress to finish."""
+        self._stop.set()
+        with self._work:
+            self._work.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def wait(self, timeout=None):
+        """Block until stop() is called or the timeout passes; returns whether it was stopped."""
+        return self._stop.wait(timeout)
+
+    def due(self, moment):
+        """Symbols whose interval boundary falls on moment, in the order they were given."""
+        offset = self._micros_since_midnight(moment)
+        return [symbol for symbol, interval in self.intervals.items() if offset % (interval * 10 ** 6) == 0]
+
+    def next_run(self, moment=None):
+        """(time, symbols) of the next pull at or after moment, skipping closed hours."""
+        moment = moment or self.clock()
+        while True:
+            open_, close = self.calendar.next_session(moment)
+            if moment <= open_:
+                return open_, list(self.intervals)
+            # Round up to the next whole tick past local midnight
+            boundary = moment + timedelta(microseconds=-self._micros_since_midnight(moment) % (self._tick * 10 ** 6))
+            if boundary < close:
+                symbols = self.due(boundary)
+                if symbols:
+                    return boundary, symbols
+                moment = boundary + timedelta(seconds=self._tick)
+                continue
+            if moment <= close:
+                return close, list(self.intervals)
+            moment = close + timedelta(microseconds=1)
+
+    def _micros_since_midnight(self, moment):
+        # Whole microseconds, so boundaries compare exactly
+        local = moment.astimezone(self.calendar.tz)
+        return (local.hour * 3600 + local.minute * 60 + local.second) * 10 ** 6 + local.microsecond
+
+    def _sleep_until(self, moment):
+        # Returns False once stopped
+        while not self._stop.is_set():
+            remaining = (moment - self.clock()).total_seconds()
+            if remaining <= 0:
+                return True
+            self._stop.wait(min(remaining, MAX_SLEEP))
+        return False
+
+    def _schedule(self):
+        moment = self.clock()
+        while not self._stop.is_set():
+            run_at, symbols = self.next_run(moment)
+            if not self._sleep_until(run_at):
+                break
+            self._dispatch(symbols)
+            # After a late wake-up (suspend, clock change) resume from now
+            # rather than firing every boundary that was missed
+            moment = max(run_at + timedelta(microseconds=1), self.clock())
+
+    def _dispatch(self, symbols):
+        with self._work:
+            if self._busy or self._pending:
+                if self.overrun == 'skip':
+                    self.skipped += 1
+                    instrumentation.count('recorder.skipped_runs')
+                    print(f"Previous collection still running; skipping {len(symbols)} symbols")
+                    return
+                self.coalesced += 1
+                instrumentation.count('recorder.coalesced_runs')
+            self._pending.update(symbols)
+            self._work.notify()
+
+    def _work_loop(self):
+        order = {symbol: i for i, symbol in enumerate(self.intervals)}
+        while True:
+            with self._work:
+                while not self._pending and not self._stop.is_set():
+                    self._work.wait()
+                if self._stop.is_set():
+                    return
+                symbols = sorted(self._pending, key=order.get)
+                self._pending.clear()
+                self._busy = True
+            try:
+                self.job(symbols)
+            except Exception as e:
+                print(f"Data collection failed: {e}")
+            finally:
+                with self._work:
+                    self._busy = False
+                    self.runs += 1
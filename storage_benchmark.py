@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from options_storage import (HDF5Storage, ParquetStorage, DeltaStorage, read_options, read_chain_as_of,
+                             STRIKE_COLUMN, EXPIRY_COLUMN)
+
+# Compares the options recorder storage backends on synthetic chains: bytes
+# on disk, time to write every pull, and time to read all or part of it back.
+
+
+def synthetic_option_chain(symbol, underlying, timestamp, expiries=8, strikes=40, rng=None):
+    """A chain shaped like OptionsChainFetcher.fetch output, with `expiries` x `strikes` calls and puts."""
+    rng = rng or np.random.default_rng()
+    base = timestamp.date()
+    options = []
+    for e in range(expiries):
+        expiry = (base + timedelta(days=7 * (e + 1))).isoformat()
+        years = 7 * (e + 1) / 365
+        for k in range(strikes):
+            strike = round(underlying * (0.8 + 0.4 * k / max(strikes - 1, 1)), 1)
+            moneyness = np.log(underlying / strike)
+            for put_call in ('CALL', 'PUT'):
+                intrinsic = max(0.0, underlying - strike) if put_call == 'CALL' else max(0.0, strike - underlying)
+                mark = intrinsic + underlying * 0.25 * np.sqrt(years) * 0.4 * np.exp(-abs(moneyness) * 5)
+                spread = max(0.01, 0.02 * mark)
+                delta = 1 / (1 + np.exp(-moneyness * 10))
+                options.append({
+                    'symbol': f"{symbol}_{expiry.replace('-', '')}{put_call[0]}{strike:g}",
+                    'description': f"{symbol} {expiry} {strike:g} {put_call}",
+                    'putCall': put_call,
+                    'strikePrice': strike,
+                    'expirationDate': expiry,
+                    'bid': round(mark - spread / 2, 2),
+                    'ask': round(mark + spread / 2, 2),
+                    'last': round(mark + rng.normal(0, spread / 4), 2),
+                    'totalVolume': int(rng.integers(0, 5000)),
+                    'openInterest': int(rng.integers(0, 50000)),
+                    'volatility': round(25 + rng.normal(0, 2), 3),
+                    'delta': round(delta if put_call == 'CALL' else delta - 1, 4),
+                    'gamma': round(rng.uniform(0, 0.1), 4),
+                    'theta': round(-rng.uniform(0, 0.5), 4),
+                    'vega': round(rng.uniform(0, 0.5), 4),
+                })
+    return {'symbol': symbol, 'underlyingPrice': underlying, 'options': options}
+
+
+def synthetic_pulls(symbols=10, pulls=78, expiries=8, strikes=40, seed=0, start=None, change_fraction=0.25):
+    """(symbol, chain, timestamp) for every 5-minute pull of one session.
+
+    Strikes are fixed at the session's first pull and only about
+    `change_fraction` of the contracts get a new quote on each later pull.
+    """
+    rng = np.random.default_rng(seed)
+    start = start or datetime(2024, 1, 2, 9, 30)
+    prices = {f"SYM{i}": 50 + 450 * rng.random() for i in range(symbols)}
+    opening = dict(prices)
+    previous = {}
+    snapshots = []
+    for p in range(pulls):
+        timestamp = start + timedelta(minutes=5 * p)
+        for symbol in prices:
+            prices[symbol] *= np.exp(rng.normal(0, 0.002))
+            chain = synthetic_option_chain(symbol, opening[symbol], timestamp, expiries, strikes, rng)
+            if symbol in previous:
+                stale = rng.random(len(chain['options'])) >= change_fraction
+                chain['options'] = [old if keep else new for old, new, keep
+                                    in zip(previous[symbol]['options'], chain['options'], stale)]
+            chain['underlyingPrice'] = prices[symbol]
+            previous[symbol] = chain
+            snapshots.append((symbol, chain, timestamp))
+    return snapshots
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def benchmark_storage(symbols=10, pulls=78, expiries=8, strikes=40, change_fraction=0.25, workdir=None):
+    """Write the same pulls with each backend and time full and filtered reads.
+
+    For the delta backend the reads rebuild the chain as of the last pull.
+    """
+    snapshots = synthetic_pulls(symbols, pulls, expiries, strikes, change_fraction=change_fraction)
+    first_symbol, first_chain, _ = snapshots[0]
+    expiry = first_chain['options'][0][EXPIRY_COLUMN]
+    strikes_seen = sorted({o[STRIKE_COLUMN] for o in first_chain['options']})
+    low, high = strikes_seen[len(strikes_seen) // 3], strikes_seen[2 * len(strikes_seen) // 3]
+    rows = sum(len(chain['options']) for _, chain, _ in snapshots)
+
+    workdir = workdir or tempfile.mkdtemp(prefix='storage_benchmark_')
+    results = {'rows': rows, 'snapshots': len(snapshots)}
+    try:
+        last_pull = snapshots[-1][2]
+        backends = (('hdf5', HDF5Storage), ('parquet', ParquetStorage),
+                    ('parquet-delta', lambda path: DeltaStorage(ParquetStorage(path))))
+        for name, backend in backends:
+            output_dir = os.path.join(workdir, name)
+            storage = backend(output_dir)
+            start = time.perf_counter()
+            for symbol, chain, timestamp in snapshots:
+                storage.save(symbol, chain, timestamp)
+            write_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            if name == 'hdf5':
+                full = pd.read_hdf(storage.path(first_symbol), key=first_symbol)
+            elif name == 'parquet':
+                full = read_options(output_dir, symbols=[first_symbol])
+            else:
+                full = read_chain_as_of(output_dir, first_symbol, last_pull)
+            read_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            if name == 'hdf5':
+                subset = pd.read_hdf(storage.path(first_symbol), key=first_symbol,
+                                     where=f"{EXPIRY_COLUMN} == '{expiry}' & {STRIKE_COLUMN} >= {low} & {STRIKE_COLUMN} <= {high}")
+            elif name == 'parquet':
+                subset = read_options(output_dir, symbols=[first_symbol], expiries=[expiry], min_strike=low,
+                                      max_strike=high)
+            else:
+                chain = read_chain_as_of(output_dir, first_symbol, last_pull)
+                subset = chain[(chain[EXPIRY_COLUMN] == expiry) & chain[STRIKE_COLUMN].between(low, high)]
+            filtered_seconds = time.perf_counter() - start
+
+            results[name] = {
+                'bytes': directory_size(output_dir),
+                'write_seconds': write_seconds,
+                'snapshots_per_second': len(snapshots) / write_seconds,
+                'read_symbol_seconds': read_seconds,
+                'read_symbol_rows': len(full),
+                'filtered_read_seconds': filtered_seconds,
+                'filtered_read_rows': len(subset),
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the options storage backends")
+    parser.add_argument('--symbols', type=int, default=10)
+    parser.add_argument('--pulls', type=int, default=78, help="5-minute pulls per symbol (78 is one session)")
+    parser.add_argument('--expiries', type=int, default=8)
+    parser.add_argument('--strikes', type=int, default=40)
+    parser.add_argument('--change-fraction', type=float, default=0.25,
+                        help="fraction of contracts whose quote changes between pulls")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = benchmark_storage(args.symbols, args.pulls, args.expiries, args.strikes, args.change_fraction)
+    print(f"{results['snapshots']} snapshots, {results['rows']} option rows")
+    for name in ('hdf5', 'parquet', 'parquet-delta'):
+        r = results[name]
+        print(f"{name:13s} {r['bytes'] / 1e6:8.2f} MB  write {r['write_seconds']:7.2f}s  "
+              f"read {r['read_symbol_seconds']:6.3f}s  filtered read {r['filtered_read_seconds']:6.3f}s")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
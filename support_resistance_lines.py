@@ -1,14 +1,26 @@
 #claude sonnet 3.5
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import pandas as pd
 import numpy as np
+import matplotlib
 import mplfinance as mpf
 from scipy.signal import find_peaks
-from sklearn.linear_model import LinearRegression
+
+from incremental_regression import IncrementalLinearRegression, regression_arrays
+from market_data import load_frame
+
+# Chart size for rendered files; candles are downsampled to about one per
+# PIXELS_PER_BAR horizontal pixels
+CHART_WIDTH = 1600
+CHART_HEIGHT = 800
+CHART_DPI = 100
+PIXELS_PER_BAR = 2
 
 def load_data(file_path):
-    df = pd.read_csv(file_path, parse_dates=['date_time'])
-    df.set_index('date_time', inplace=True)
-    return df
+    return load_frame(file_path, date_column='date_time', index=True)
 
 def find_support_resistance(data, window=20, prominence=0.5):
     highs = data['high'].rolling(window=window, center=True).max()
@@ -19,55 +31,232 @@ def find_support_resistance(data, window=20, prominence=0.5):
     
     return high_peaks, low_peaks
 
-def calculate_line_strength(data, line_index, window=10):
-    touches = sum((data['low'].iloc[max(0, line_index-window):line_index+window] >= data['low'].iloc[line_index]) &
-                  (data['low'].iloc[max(0, line_index-window):line_index+window] <= data['low'].iloc[line_index] + 0.01 * data['low'].iloc[line_index]))
-    return touches
+def calculate_line_strength(data, line_index, window=10, tolerance=0.01, side='support'):
+    return int(line_strengths(data, [line_index], window, tolerance, side)[0])
 
-def find_trend_channels(data, window=20):
-    x = np.arange(len(data)).reshape(-1, 1)
-    y_high = data['high'].values.reshape(-1, 1)
-    y_low = data['low'].values.reshape(-1, 1)
-    
-    reg_high = LinearRegression().fit(x, y_high)
-    reg_low = LinearRegression().fit(x, y_low)
-    
-    channel_high = reg_high.predict(x)
-    channel_low = reg_low.predict(x)
-    
+# Function to score many candidate lines at once
+def line_strengths(data, line_indices, window=10, tolerance=0.01, side='support', chunk_size=4096):
+    """Touch counts for every candidate in one pass.
+
+    A support line at a low counts the lows in the surrounding 2 * window
+    bars that sit between the level and level * (1 + tolerance); a
+    resistance line at a high counts the highs between level * (1 - tolerance)
+    and the level.
+    """
+    prices = (data['low'] if side == 'support' else data['high']).to_numpy(dtype=float)
+    line_indices = np.asarray(line_indices, dtype=np.int64)
+    # NaN padding keeps windows near either end the same shape; NaN never counts as a touch
+    padded = np.concatenate((np.full(window, np.nan), prices, np.full(window, np.nan)))
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * window)
+
+    strengths = np.empty(len(line_indices), dtype=np.int64)
+    for start in range(0, len(line_indices), chunk_size):
+        chunk = line_indices[start:start + chunk_size]
+        levels = prices[chunk][:, None]
+        around = windows[chunk]
+        if side == 'support':
+            touches = (around >= levels) & (around <= levels * (1 + tolerance))
+        else:
+            touches = (around <= levels) & (around >= levels * (1 - tolerance))
+        strengths[start:start + chunk_size] = touches.sum(axis=1)
+    return strengths
+
+# Function to merge candidates within tolerance of each other into one level
+def cluster_levels(levels, strengths, tolerance=0.01):
+    """Group levels less than `tolerance` apart (relative to the group's lowest level).
+
+    Returns, per cluster, the position of its strongest member in `levels`
+    and the cluster's total touches, so a level hit many times across
+    history outranks one strong isolated peak.
+    """
+    levels = np.asarray(levels, dtype=float)
+    strengths = np.asarray(strengths)
+    if len(levels) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=strengths.dtype)
+    order = np.argsort(levels, kind='stable')
+    sorted_levels = levels[order]
+
+    # Walk cluster starts with binary search: each cluster covers [start, start * (1 + tolerance)]
+    starts = []
+    i = 0
+    while i < len(sorted_levels):
+        starts.append(i)
+        i = np.searchsorted(sorted_levels, sorted_levels[i] * (1 + tolerance), side='right')
+    starts = np.array(starts)
+    labels = np.zeros(len(levels), dtype=np.int64)
+    labels[order] = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(levels))))
+
+    totals = np.bincount(labels, weights=strengths, minlength=len(starts)).astype(strengths.dtype)
+    # Strongest member per cluster: sort by (label, strength) and take each label's last entry
+    by_strength = np.lexsort((strengths, labels))
+    last = np.append(np.flatnonzero(np.diff(labels[by_strength])), len(levels) - 1)
+    return by_strength[last], totals
+
+# Function to pick the strongest distinct levels among the peaks
+def rank_levels(data, peaks, side='support', window=10, tolerance=0.01, top=5):
+    peaks = np.unique(np.asarray(peaks, dtype=np.int64))
+    if len(peaks) == 0:
+        return []
+    prices = (data['low'] if side == 'support' else data['high']).to_numpy(dtype=float)
+    strengths = line_strengths(data, peaks, window, tolerance, side)
+    members, totals = cluster_levels(prices[peaks], strengths, tolerance)
+    best = np.argsort(-totals, kind='stable')[:top]
+    return peaks[members[best]].tolist()
+
+def find_trend_channels(data, window=None):
+    """Least-squares lines through the highs and the lows.
+
+    With window=None one line is fitted over the whole history. Otherwise
+    each bar gets the value at that bar of the line fitted over the last
+    `window` bars, the same value StreamingTrendChannel reports live; bars
+    before the third are NaN.
+    """
+    highs = data['high'].to_numpy(dtype=float)
+    lows = data['low'].to_numpy(dtype=float)
+    x = np.arange(len(data))
+    if window is None:
+        channel_high = np.polyval(np.polyfit(x, highs, 1), x)
+        channel_low = np.polyval(np.polyfit(x, lows, 1), x)
+        return channel_high, channel_low
+
+    fit_high = regression_arrays(highs, window=window, log=False)
+    fit_low = regression_arrays(lows, window=window, log=False)
+    channel_high = fit_high.intercept + fit_high.slope * x
+    channel_low = fit_low.intercept + fit_low.slope * x
     return channel_high, channel_low
 
-def plot_stock_analysis(data, support_levels, resistance_levels, channel_high, channel_low):
-    apds = []
-    
-    for level in support_levels:
-        apds.append(mpf.make_addplot(pd.Series([data['low'].iloc[level]] * len(data), index=data.index),
-                                     type='line', color='g', alpha=0.7, linewidth=1))
-    
-    for level in resistance_levels:
-        apds.append(mpf.make_addplot(pd.Series([data['high'].iloc[level]] * len(data), index=data.index),
-                                     type='line', color='r', alpha=0.7, linewidth=1))
-    
-    apds.append(mpf.make_addplot(pd.Series(channel_high.flatten(), index=data.index),
-                                 type='line', color='b', alpha=0.7, linewidth=1))
-    apds.append(mpf.make_addplot(pd.Series(channel_low.flatten(), index=data.index),
-                                 type='line', color='b', alpha=0.7, linewidth=1))
-    
-    mpf.plot(data, type='candle', style='yahoo', title='Stock Price Analysis',
-             addplot=apds, volume=True, figsize=(20, 10))
+class StreamingTrendChannel:
+    """Rolling trend channel updated one bar at a time, for live bars."""
+
+    def __init__(self, window):
+        self.high = IncrementalLinearRegression(window)
+        self.low = IncrementalLinearRegression(window)
+
+    def update(self, high, low):
+        """Add a bar and return (channel_high, channel_low) at that bar; NaN until 3 bars."""
+        self.high.update(high)
+        self.low.update(low)
+        if self.high.n < 3:
+            return np.nan, np.nan
+        x = self.high.last_x
+        return self.high.predict(x), self.low.predict(x)
+
+# Function to downsample OHLC bars into at most max_bars buckets
+def decimate_ohlc(data, max_bars):
+    """Bucket consecutive bars, keeping each bucket's first open, max high, min low and last close.
+
+    The extremes survive, so the downsampled chart has the same range and
+    wicks as the full one. Extra columns are summed (volume) or take the
+    bucket's last value. Returns the bucketed frame, indexed by each
+    bucket's first timestamp, and the position of each bucket's last bar.
+    """
+    size = len(data)
+    if size <= max_bars:
+        return data, np.arange(size)
+    starts = np.linspace(0, size, max_bars, endpoint=False).astype(np.int64)
+    ends = np.append(starts[1:], size) - 1
+    columns = {}
+    for column in data.columns:
+        values = data[column].to_numpy()
+        if column == 'open':
+            columns[column] = values[starts]
+        elif column == 'high':
+            columns[column] = np.maximum.reduceat(values, starts)
+        elif column == 'low':
+            columns[column] = np.minimum.reduceat(values, starts)
+        elif column == 'volume':
+            columns[column] = np.add.reduceat(values, starts)
+        else:
+            columns[column] = values[ends]
+    return pd.DataFrame(columns, index=data.index[starts]), ends
+
+def plot_stock_analysis(data, support_levels, resistance_levels, channel_high, channel_low, output_path=None,
+                        width=CHART_WIDTH, height=CHART_HEIGHT, dpi=CHART_DPI, title='Stock Price Analysis'):
+    """Plot candles with support/resistance levels and the trend channel.
+
+    Bars are downsampled to the chart's pixel width first. With output_path
+    the chart is written to that file (PNG, SVG, ... by extension) without a
+    display; otherwise it is shown interactively.
+    """
+    if output_path is not None:
+        matplotlib.use('Agg')
+
+    levels = [data['low'].iloc[level] for level in support_levels] + \
+             [data['high'].iloc[level] for level in resistance_levels]
+    colors = ['g'] * len(support_levels) + ['r'] * len(resistance_levels)
 
-def main(file_path):
+    bars, last_bars = decimate_ohlc(data, max(1, width // PIXELS_PER_BAR))
+    apds = [
+        mpf.make_addplot(np.asarray(channel_high).ravel()[last_bars], type='line', color='b', alpha=0.7, width=1),
+        mpf.make_addplot(np.asarray(channel_low).ravel()[last_bars], type='line', color='b', alpha=0.7, width=1),
+    ]
+
+    kwargs = dict(type='candle', style='yahoo', title=title, addplot=apds, volume='volume' in bars.columns,
+                  figsize=(width / dpi, height / dpi), warn_too_much_data=len(bars) + 1)
+    if levels:
+        kwargs['hlines'] = dict(hlines=levels, colors=colors, alpha=0.7, linewidths=1)
+    if output_path is not None:
+        kwargs['savefig'] = dict(fname=output_path, dpi=dpi)
+    mpf.plot(bars, **kwargs)
+
+# Function to find the levels and channel for one CSV
+def analyze(file_path, tolerance=0.01, strength_window=10, top=5, channel_window=None):
     data = load_data(file_path)
     
     high_peaks, low_peaks = find_support_resistance(data)
     
-    support_levels = sorted(low_peaks, key=lambda x: calculate_line_strength(data, x), reverse=True)[:5]
-    resistance_levels = sorted(high_peaks, key=lambda x: calculate_line_strength(data, x), reverse=True)[:5]
+    support_levels = rank_levels(data, low_peaks, 'support', strength_window, tolerance, top)
+    resistance_levels = rank_levels(data, high_peaks, 'resistance', strength_window, tolerance, top)
     
-    channel_high, channel_low = find_trend_channels(data)
-    
-    plot_stock_analysis(data, support_levels, resistance_levels, channel_high, channel_low)
+    channel_high, channel_low = find_trend_channels(data, channel_window)
+    return data, support_levels, resistance_levels, channel_high, channel_low
+
+def main(file_path, tolerance=0.01, strength_window=10, top=5, channel_window=None, output_path=None,
+         title='Stock Price Analysis'):
+    analysis = analyze(file_path, tolerance, strength_window, top, channel_window)
+    plot_stock_analysis(*analysis, output_path=output_path, title=title)
+
+# Function to render one symbol's chart to a file; runs in a worker process
+def render_chart(file_path, output_path, **options):
+    try:
+        main(file_path, output_path=output_path, **options)
+    except Exception as e:
+        return file_path, f"{type(e).__name__}: {e}"
+    return file_path, ''
+
+def render_charts(file_paths, output_dir, image_format='png', workers=None, **options):
+    """Render one chart per CSV into output_dir/<name>.<image_format> in parallel.
+
+    Returns {file_path: error message, or '' on success}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    errors = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for file_path in file_paths:
+            name = os.path.splitext(os.path.basename(file_path))[0]
+            output_path = os.path.join(output_dir, f"{name}.{image_format}")
+            futures.append(executor.submit(render_chart, file_path, output_path, title=name, **options))
+        for future in as_completed(futures):
+            file_path, error = future.result()
+            errors[file_path] = error
+            if error:
+                print(f"Error rendering {file_path}: {error}")
+    return errors
 
 if __name__ == "__main__":
-    file_path = "path_to_your_csv_file.csv"
-    main(file_path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Support/resistance levels and trend channels")
+    parser.add_argument('files', nargs='+', help="CSV files with a date_time column")
+    parser.add_argument('--output-dir', help="write one chart per file here instead of showing it")
+    parser.add_argument('--format', default='png', help="image format for --output-dir, e.g. png or svg")
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--tolerance', type=float, default=0.01, help="touch tolerance as a fraction of price")
+    parser.add_argument('--channel-window', type=int, help="bars per rolling channel fit; default whole history")
+    args = parser.parse_args()
+
+    options = dict(tolerance=args.tolerance, channel_window=args.channel_window)
+    if args.output_dir:
+        render_charts(args.files, args.output_dir, args.format, args.workers, **options)
+    else:
+        for file_path in args.files:
+            main(file_path, **options)
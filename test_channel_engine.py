@@ -0,0 +1,32 @@
+import numpy as np
+
+import channel_engine
+from logregress_channel_backtest_claude import half_kelly_criterion
+from metrics import summarize
+
+
+def _buy_and_hold(size=300, entry=150):
+    # One buy on `entry`, never a sell, over a close that rises then falls back
+    close = np.concatenate([np.linspace(100, 120, size // 2), np.linspace(120, 100, size - size // 2)])
+    buy = np.zeros(size, dtype=bool)
+    buy[entry] = True
+    return close, buy, np.zeros(size, dtype=bool)
+
+
+def test_log_kernel_buy_and_hold_drawdown():
+    close, buy, sell = _buy_and_hold()
+    trades, cash, equity, _, _, _ = channel_engine.log_channel_kernel(buy, close, sell, close, close,
+                                                                      half_kelly_criterion, margin=0.5)
+    assert len(trades) == 1 and cash[-1] < 0
+    shares = trades[0][3]
+    np.testing.assert_allclose(equity, cash + np.where(np.arange(100, len(close)) >= 150, shares, 0) * close[100:])
+    assert summarize(equity)['max_drawdown'] > -1
+    assert np.isfinite(summarize(equity)['cagr'])
+
+
+def test_exp_kernel_buy_and_hold_drawdown():
+    close, buy, sell = _buy_and_hold()
+    trades, cash, equity = channel_engine.exp_channel_kernel(close, close, buy, sell, start_value=100)
+    assert len(trades) == 1 and cash[-1] < 0
+    assert equity[-1] == cash[-1] + close[-1]
+    assert summarize(equity)['max_drawdown'] > -1
@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# OAuth token cache shared by schwab_authentication.py and the options
+# recorder. The token lives in a small JSON file guarded by a lock file, and
+# TokenManager renews it with the refresh token shortly before it expires, so
+# the interactive browser login is only needed when the refresh token itself
+# is gone or rejected.
+
+TOKEN_FILE = 'schwab_token.json'
+REFRESH_MARGIN = 300  # seconds before expires_at to renew the access token
+RETRY_SECONDS = 30  # wait after a failed background refresh, and the shortest wait between refreshes
+DEFAULT_LIFETIME = 1800  # seconds, for token responses without a usable expires_in
+REQUEST_TIMEOUT = 10
+
+
+class InvalidRefreshToken(Exception):
+    """The token endpoint rejected the refresh token; a new login is needed."""
+
+
+class TokenStore:
+    """JSON token file, read and written under an exclusive lock on <path>.lock."""
+
+    def __init__(self, path=TOKEN_FILE):
+        self.path = path
+
+    @contextmanager
+    def locked(self):
+        with open(self.path + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self):
+        """The stored token dict, or None if there is none."""
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save(self, token):
+        # Write to a private temp file and rename, so readers never see half a token
+        temp_path = self.path + '.tmp'
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(token, f)
+        os.replace(temp_path, self.path)
+
+
+def refresh_access_token(token, token_url, client_id, client_secret, session=None):
+    """Exchange the refresh token for a new token dict with an absolute expires_at."""
+    http = session or requests
+    response = http.post(token_url,
+                         data={'grant_type': 'refresh_token', 'refresh_token': token['refresh_token']},
+                         auth=(client_id, client_secret), timeout=REQUEST_TIMEOUT)
+    if response.status_code in (400, 401):
+        raise InvalidRefreshToken(f"Token endpoint rejected the refresh token: HTTP {response.status_code}")
+    response.raise_for_status()
+
+    refreshed = response.json()
+    # Servers that do not rotate refresh tokens omit it from the response
+    refreshed.setdefault('refresh_token', token['refresh_token'])
+    refreshed.pop('expires_at', None)
+    return with_expiry(refreshed)
+
+
+def with_expiry(token):
+    """Give a token dict an absolute expires_at if it lacks one.
+
+    A missing or zero expires_in counts as DEFAULT_LIFETIME, so a server
+    that leaves it out is not asked for a new token on every call.
+    """
+    if not token.get('expires_at'):
+        lifetime = float(token.get('expires_in') or 0) or DEFAULT_LIFETIME
+        token['expires_at'] = time.time() + lifetime
+    return token
+
+
+class TokenManager:
+    """Serves a valid access token and renews it in the background before it expires.
+
+    authorize() runs the interactive login and returns a new token dict; it
+    is only called when there is no stored refresh token or it is rejected.
+    """
+
+    def __init__(self, store, token_url, client_id, client_secret, authorize=None, refresh_margin=REFRESH_MARGIN):
+        self.store = store
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.authorize = authorize
+        self.refresh_margin = refresh_margin
+        self.token = store.load()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._session = requests.Session()
+
+    def _refresh_at(self, token):
+        if not token:
+            return 0
+        # Tokens living less than twice the margin are renewed at half their lifetime
+        margin = min(self.refresh_margin, float(token.get('expires_in') or DEFAULT_LIFETIME) / 2)
+        return token.get('expires_at', 0) - margin
+
+    def _expires_soon(self, token):
+        return self._refresh_at(token) <= time.time()
+
+    def access_token(self):
+        """Current access token, refreshing first if it is about to expire."""
+        if self._expires_soon(self.token):
+            self.ensure_valid()
+        return self.token['access_token']
+
+    def ensure_valid(self):
+        """Make sure the held token is valid for at least refresh_margin seconds."""
+        with self._lock:
+            if not self._expires_soon(self.token):
+                return self.token
+            with self.store.locked():
+                # Another process may already have refreshed the shared file
+                stored = self.store.load()
+                if not self._expires_soon(stored):
+                    self.token = stored
+                    return self.token
+                token = stored or self.token
+                try:
+                    if not token or not token.get('refresh_token'):
+                        raise InvalidRefreshToken("No refresh token stored")
+                    token = refresh_access_token(token, self.token_url, self.client_id, self.client_secret,
+                                                 session=self._session)
+                except InvalidRefreshToken as e:
+                    if self.authorize is None:
+                        raise
+                    print(f"{e}. Performing OAuth authentication...")
+                    token = with_expiry(dict(self.authorize()))
+                self.store.save(token)
+                self.token = token
+                return token
+
+    def start(self):
+        """Start the background renewal thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='token-refresh', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._session.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Never less than RETRY_SECONDS, so a short-lived token cannot spin this loop
+            if self._stop.wait(max(RETRY_SECONDS, self._refresh_at(self.token) - time.time())):
+                return
+            try:
+                self.ensure_valid()
+            except Exception as e:
+                print(f"Token refresh failed: {e}")
+                self._stop.wait(RETRY_SECONDS)
@@ -0,0 +1,204 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import channel_engine
+import logregress_channel_backtest_claude as logregress
+from market_data import load_frame
+from metrics import summarize
+from parameter_sweep import LOG_DEFAULTS, PRICE_COLUMNS
+
+# Walk-forward evaluation of the log channel strategy. History is split into
+# consecutive train/test folds. On each fold the band multiplier is chosen
+# and the Kelly allocation estimated from the training bars only, then both
+# are frozen and traded over the unseen test bars.
+#
+# The regression channel is computed once for the whole history. Each bar's
+# fit only uses the bars before it, so a fold reads the fit state as it
+# stood at that bar instead of refitting. The folds then run in parallel
+# over a shared memory copy of prices and bands, and the total cost stays
+# close to one pass over the data.
+
+TRAIN_BARS = 3 * 252
+TEST_BARS = 252
+BAND_MULTS = (0.3, 0.5, 0.7)
+SELECT_BY = 'sharpe'
+
+# Rows of the shared (7, n) array
+OPEN, HIGH, LOW, CLOSE, CENTER, UPPER, LOWER = range(7)
+
+
+def walk_forward_folds(size, train_bars=TRAIN_BARS, test_bars=TEST_BARS, step=None, anchored=False,
+                       warmup=channel_engine.WARMUP_BARS):
+    """(train_start, train_end, test_start, test_end) bar ranges, end-exclusive.
+
+    Test windows follow each other every `step` bars (default test_bars).
+    Rolling folds train on the train_bars before the test window; anchored
+    folds train on everything since warmup.
+    """
+    step = step or test_bars
+    folds = []
+    train_end = warmup + train_bars
+    while train_end < size:
+        test_end = min(train_end + test_bars, size)
+        train_start = warmup if anchored else train_end - train_bars
+        folds.append((train_start, train_end, train_end, test_end))
+        train_end += step
+    return folds
+
+
+def _attach_data(name, shape):
+    global _shared_block, _shared_data
+    _shared_block = shared_memory.SharedMemory(name=name)
+    _shared_data = np.ndarray(shape, dtype=np.float64, buffer=_shared_block.buf)
+
+
+def _run_span(data, start, end, band_mult, allocation, params):
+    # Trade bars [start, end) with a fixed allocation; a position still open
+    # at the end is sold at the last close so every span ends flat. Only the
+    # span and the bar before it (for the previous close) are scanned, so a
+    # span costs its own length, not the history before it.
+    span = data[:, start - 1:end]
+    buy, buy_price, sell, sell_price = channel_engine.log_channel_signals(
+        span[OPEN], span[HIGH], span[CLOSE], span[CENTER], span[UPPER], span[LOWER], band_mult=band_mult)
+    kelly = partial(logregress.half_kelly_criterion, fraction=params['kelly_fraction'])
+    trades, cash, equity, _, profits, losses = channel_engine.log_channel_kernel(
+        buy, buy_price, sell, sell_price, span[CLOSE], kelly, start_value=params['start_value'],
+        allocation=allocation, margin=params['margin'], spread=params['spread'], kelly_after=span.shape[1], warmup=1)
+    trades = [(side, bar + start - 1, *rest) for side, bar, *rest in trades]
+    # Metrics use the equity curve, the open position priced at each close
+    values = np.array(equity, dtype=float)
+    if trades and trades[-1][0] == 'buy' and trades[-1][3] > 0:
+        values[-1] = cash[-1] + trades[-1][3] * data[CLOSE, end - 1] * (1 - params['spread'])
+    return trades, values, profits, losses
+
+
+def _kelly_allocation(profits, losses, params):
+    # The allocation the backtest would switch to after these trades
+    if not (profits and losses):
+        return params['allocation']
+    avg_profit = np.mean(profits)
+    avg_loss = abs(np.mean(losses))
+    win_ratio = len(profits) / (len(profits) + len(losses))
+    return logregress.half_kelly_criterion(avg_profit, avg_loss, win_ratio, fraction=params['kelly_fraction'])
+
+
+def evaluate_fold(data, fold, band_mults=BAND_MULTS, select_by=SELECT_BY, params=None):
+    """Pick band_mult and allocation on the fold's training bars, then trade its test bars."""
+    params = {**LOG_DEFAULTS, **(params or {})}
+    train_start, train_end, test_start, test_end = fold
+
+    best = None
+    for band_mult in band_mults:
+        trades, values, profits, losses = _run_span(data, train_start, train_end, band_mult,
+                                                    params['allocation'], params)
+        train = summarize(values, len(trades), periods_per_year=252)
+        score = train[select_by] if np.isfinite(train[select_by]) else -np.inf
+        if best is None or score > best[0]:
+            best = (score, band_mult, train, profits, losses)
+    _, band_mult, train, profits, losses = best
+    allocation = _kelly_allocation(profits, losses, params)
+
+    trades, values, _, _ = _run_span(data, test_start, test_end, band_mult, allocation, params)
+    test = summarize(values, len(trades), periods_per_year=252)
+    row = {'train_start': train_start, 'train_end': train_end, 'test_start': test_start, 'test_end': test_end,
+           'band_mult': band_mult, 'allocation': allocation}
+    row.update({f"train_{name}": value for name, value in train.items()})
+    row.update({f"test_{name}": value for name, value in test.items()})
+    return row, values
+
+
+def _evaluate_in_worker(fold, band_mults, select_by, params):
+    return evaluate_fold(_shared_data, fold, band_mults, select_by, params)
+
+
+def walk_forward(data_frame, train_bars=TRAIN_BARS, test_bars=TEST_BARS, step=None, anchored=False,
+                 band_mults=BAND_MULTS, select_by=SELECT_BY, window=None, workers=None, params=None):
+    """Run every fold in parallel and return (per-fold table, aggregate metrics, out-of-sample curve).
+
+    The out-of-sample curve chains each fold's test returns, starting from
+    the strategy's start value.
+    """
+    params = {**LOG_DEFAULTS, **(params or {})}
+    prices = data_frame[PRICE_COLUMNS].to_numpy(dtype=np.float64).T
+    center, upper, lower = channel_engine.log_channel_bands(prices[CLOSE], window=window, warmup=params['warmup'])
+    data = np.ascontiguousarray(np.vstack([prices, center, upper, lower]))
+    folds = walk_forward_folds(data.shape[1], train_bars, test_bars, step, anchored, params['warmup'])
+    if not folds:
+        raise ValueError(f"{data.shape[1]} bars are not enough for one fold of {train_bars} training bars")
+
+    block = shared_memory.SharedMemory(create=True, size=data.nbytes)
+    try:
+        np.ndarray(data.shape, dtype=np.float64, buffer=block.buf)[:] = data
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_data,
+                                 initargs=(block.name, data.shape)) as executor:
+            results = list(executor.map(_evaluate_in_worker, folds, [band_mults] * len(folds),
+                                        [select_by] * len(folds), [params] * len(folds)))
+    finally:
+        block.close()
+        block.unlink()
+
+    rows = [row for row, _ in results]
+    table = pd.DataFrame(rows)
+    dates = data_frame['date'].to_numpy() if 'date' in data_frame.columns else None
+    if dates is not None:
+        for column in ('train_start', 'test_start'):
+            table[column.replace('start', 'from')] = dates[table[column]]
+        for column in ('train_end', 'test_end'):
+            table[column.replace('end', 'to')] = dates[table[column] - 1]
+    table.insert(0, 'fold', np.arange(1, len(table) + 1))
+
+    # Chain the test curves: each fold's curve is scaled to start where the previous one ended
+    curve = []
+    level = float(params['start_value'])
+    for _, values in results:
+        if len(values):
+            scaled = level * values / params['start_value']
+            curve.append(scaled)
+            level = scaled[-1]
+    curve = np.concatenate(curve) if curve else np.array([level])
+    aggregate = summarize(curve, int(table['test_trades'].sum()), periods_per_year=252)
+    aggregate['folds'] = len(table)
+    aggregate['mean_fold_sharpe'] = table['test_sharpe'].mean()
+    aggregate['median_fold_sharpe'] = table['test_sharpe'].median()
+    aggregate['profitable_folds'] = float((table['test_final_equity'] > params['start_value']).mean())
+    return table, aggregate, curve
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Walk-forward evaluation of the log channel strategy")
+    parser.add_argument('input_csv')
+    parser.add_argument('--train', type=int, default=TRAIN_BARS, help="training bars per fold")
+    parser.add_argument('--test', type=int, default=TEST_BARS, help="test bars per fold")
+    parser.add_argument('--step', type=int, help="bars between fold starts; default --test")
+    parser.add_argument('--anchored', action='store_true', help="train on all history since warmup")
+    parser.add_argument('--band-mults', default=','.join(map(str, BAND_MULTS)),
+                        help="comma-separated band multipliers to choose from on each training window")
+    parser.add_argument('--select-by', choices=['sharpe', 'sortino', 'max_drawdown', 'final_equity'],
+                        default=SELECT_BY)
+    parser.add_argument('--window', type=int, help="rolling regression window in bars; default expanding")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default='walk_forward_folds.csv')
+    args = parser.parse_args(argv)
+
+    band_mults = [float(value) for value in args.band_mults.split(',')]
+    try:
+        table, aggregate, _ = walk_forward(load_frame(args.input_csv), args.train, args.test, args.step,
+                                           args.anchored, band_mults, args.select_by, args.window, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    table.to_csv(args.output, index=False)
+    print(f"Per-fold results written to {args.output}")
+    print(table[['fold', 'band_mult', 'allocation', 'train_sharpe', 'test_sharpe', 'test_max_drawdown',
+                 'test_trades']].to_string(index=False))
+    for name, value in aggregate.items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()